@@ -0,0 +1,39 @@
+class SpriteAtlas:
+    def __init__(self):
+        self.surfaces = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.surfaces)
+
+    def __contains__(self, sprite_id):
+        return sprite_id in self.surfaces
+
+    def get(self, sprite_id, factory, *args):
+        surface = self.surfaces.get(sprite_id)
+        if surface is not None:
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = self.surfaces[sprite_id] = factory(*args)
+        return surface
+
+    def report(self):
+        # Sprite ids are tuples whose first element names the kind, e.g. ('glim', color, type)
+        kinds = {}
+        for sprite_id, surface in self.surfaces.items():
+            entry = kinds.setdefault(sprite_id[0], {'sprites': 0, 'bytes': 0})
+            entry['sprites'] += 1
+            entry['bytes'] += surface.get_width() * surface.get_height() * surface.get_bytesize()
+        return {
+            'sprites': len(self.surfaces),
+            'bytes': sum(entry['bytes'] for entry in kinds.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'kinds': kinds,
+        }
+
+# Sprites are shared: callers must not draw onto or change the alpha of a surface they get back
+atlas = SpriteAtlas()
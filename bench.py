@@ -0,0 +1,184 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import numpy as np
+import pygame
+from settings import TILE_SIZE, SKY_COLOR, BEACON_RANGE
+from sim import Simulation
+from glim import Glim
+from ui import UI
+from atlas import atlas
+from structure import Wellspring, Beacon, StomperTrainingPost
+
+SCREEN_SIZE = (1920, 1080)
+STOMPER_FRACTION = 0.1
+
+def build_world(seed, glims, beacons=0, wellsprings=0, stomper_posts=0, frontier_width=10, workers=0):
+    rng = np.random.default_rng(seed)
+    sim = Simulation(SCREEN_SIZE[1], workers=workers, seed=seed)
+    game_state, grid = sim.game_state, sim.grid
+    game_state.life_essence = 10 ** 12
+    game_state.glim_cap = max(game_state.glim_cap, glims)
+    for skill in game_state.skills.values():
+        skill['unlocked'] = True
+
+    # Clear the frontier through take_damage so every index stays in sync
+    lo = max(grid.center_index - frontier_width, 0)
+    hi = min(grid.center_index + frontier_width, len(grid.tiles) - 1)
+    for tile in grid.tiles[lo:hi + 1]:
+        while tile.state != 'living':
+            tile.take_damage(tile.current_toughness)
+
+    buildable = [tile for tile in grid.tiles if tile.is_buildable()]
+    rng.shuffle(buildable)
+    wanted = [Beacon] * beacons + [Wellspring] * wellsprings + [StomperTrainingPost] * stomper_posts
+    for structure_class, tile in zip(wanted, buildable):
+        game_state.place_structure(structure_class, tile)
+
+    swarm = game_state.glims
+    for i in range(glims):
+        swarm.add(*grid.center_tile_pos, glim_type='stomper' if i < glims * STOMPER_FRACTION else 'standard')
+    swarm.x[:] = rng.uniform(lo * TILE_SIZE, (hi + 1) * TILE_SIZE, glims)
+    return sim
+
+def _stats(samples):
+    samples_ms = sorted(s * 1000 for s in samples)
+    return {
+        'median': round(statistics.median(samples_ms), 4),
+        'p95': round(samples_ms[min(len(samples_ms) - 1, int(len(samples_ms) * 0.95))], 4),
+        'min': round(samples_ms[0], 4),
+    }
+
+def _timed(samples, name, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    samples.setdefault(name, []).append(time.perf_counter() - start)
+    return result
+
+def bench_scenario(screen, scenario, frames, seed, scalar_limit, workers=0):
+    sim = build_world(seed, workers=workers, **scenario)
+    game_state, grid = sim.game_state, sim.grid
+    ui = UI(game_state, *SCREEN_SIZE)
+    camera_offset_x = grid.center_tile_pos[0] - SCREEN_SIZE[0] // 2
+    grid.set_view(camera_offset_x, camera_offset_x + SCREEN_SIZE[0])
+    delta_time = sim.timestep
+    samples = {}
+
+    for _ in range(frames):
+        # Update passes, timed the same way Simulation.step runs them
+        _timed(samples, 'grid_update', grid.update, delta_time)
+        _timed(samples, 'scheduled_events', sim.scheduler.advance, delta_time)
+        _timed(samples, 'swarm_update', game_state.glims.update, delta_time, grid,
+               game_state.glim_targeting, game_state.beacon_index)
+        sim.frame += 1
+
+        # Draw passes
+        _timed(samples, 'draw_fill', screen.fill, SKY_COLOR)
+        _timed(samples, 'draw_grid', grid.draw, screen, camera_offset_x)
+        _timed(samples, 'draw_structures', lambda: [s.draw(screen, camera_offset_x) for s in grid.structures_in_range(
+            camera_offset_x - BEACON_RANGE, camera_offset_x + SCREEN_SIZE[0] + BEACON_RANGE)])
+        _timed(samples, 'draw_glims', game_state.glims.draw, screen, camera_offset_x)
+        _timed(samples, 'draw_ui', ui.draw, screen, camera_offset_x)
+
+    # Scalar reference paths, per call, on a bounded sample of Glims
+    swarm = game_state.glims
+    scalar = [Glim(swarm.x[i], swarm.y[i], 'stomper' if swarm.glim_type[i] else 'standard', sim.rng)
+              for i in range(min(len(swarm), scalar_limit))]
+    for glim in scalar:
+        target = _timed(samples, 'find_next_target', grid.find_next_target, glim, game_state.glim_targeting)
+        buff = _timed(samples, 'get_buff_at_tile', grid.get_buff_at_tile, glim, game_state.beacon_index)
+        _timed(samples, 'glim_update', glim.update, delta_time, target, buff)
+    sim.close()
+
+    timings = {name: _stats(values) for name, values in samples.items()}
+    timings['update_total'] = _sum_medians(timings, 'grid_update', 'scheduled_events', 'swarm_update')
+    timings['draw_total'] = _sum_medians(timings, 'draw_fill', 'draw_grid', 'draw_structures', 'draw_glims', 'draw_ui')
+    return timings
+
+def _sum_medians(timings, *names):
+    return {'median': round(sum(timings[name]['median'] for name in names), 4)}
+
+def scenario_name(scenario):
+    return (f"g{scenario['glims']}_b{scenario['beacons']}_w{scenario['wellsprings']}"
+            f"_s{scenario['stomper_posts']}_f{scenario['frontier_width']}")
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base:
+            continue
+        for phase, stats in result['timings_ms'].items():
+            base_stats = base['timings_ms'].get(phase)
+            if not base_stats or base_stats['median'] <= 0:
+                continue
+            ratio = stats['median'] / base_stats['median']
+            marker = " REGRESSION" if ratio > 1 + tolerance else ""
+            print(f"{name:32} {phase:18} {base_stats['median']:10.4f} -> {stats['median']:10.4f} ms ({ratio:5.2f}x){marker}")
+            if marker:
+                regressions.append((name, phase, ratio))
+    return regressions
+
+def _int_list(text):
+    return [int(v) for v in text.split(',') if v]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the per-frame update and draw paths.")
+    parser.add_argument('--glims', type=_int_list, default=[1000, 10000, 100000])
+    parser.add_argument('--frontier-widths', type=_int_list, default=[10, 40])
+    parser.add_argument('--beacons', type=int, default=4)
+    parser.add_argument('--wellsprings', type=int, default=8)
+    parser.add_argument('--stomper-posts', type=int, default=2)
+    parser.add_argument('--frames', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--workers', type=int, default=0, help="processes sharing the swarm update")
+    parser.add_argument('--scalar-limit', type=int, default=2000, help="max Glims timed through the scalar paths")
+    parser.add_argument('--output', help="write results as JSON to this path")
+    parser.add_argument('--baseline', help="compare against a previous --output file")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed median slowdown before flagging")
+    args = parser.parse_args(argv)
+
+    pygame.init()
+    screen = pygame.display.set_mode(SCREEN_SIZE)
+
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'seed': args.seed,
+            'frames': args.frames,
+            'workers': args.workers,
+        },
+        'scenarios': {},
+    }
+    for frontier_width in args.frontier_widths:
+        for glims in args.glims:
+            scenario = {'glims': glims, 'beacons': args.beacons, 'wellsprings': args.wellsprings,
+                        'stomper_posts': args.stomper_posts, 'frontier_width': frontier_width}
+            name = scenario_name(scenario)
+            timings = bench_scenario(screen, scenario, args.frames, args.seed, args.scalar_limit, args.workers)
+            results['scenarios'][name] = {'scenario': scenario, 'timings_ms': timings, 'atlas': atlas.report()}
+            print(f"{name:32} update {timings['update_total']['median']:9.3f} ms   draw {timings['draw_total']['median']:9.3f} ms")
+
+    pygame.quit()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,8 @@ class Camera:
     def __init__(self, screen_width):
         self.screen_width = screen_width
         self.offset_x = (WORLD_WIDTH_PIXELS - self.screen_width) // 2
+        self.min_x = 0
+        self.max_x = WORLD_WIDTH_PIXELS
         self.is_dragging = False
         self.drag_start_x = 0
         self.initial_offset_x = 0
@@ -32,6 +34,15 @@ class Camera:
         
         self._clamp_offset()
     
+    def set_bounds(self, min_x, max_x):
+        # The generated part of the world; it grows as the camera nears its ends
+        self.min_x = min_x
+        self.max_x = max_x
+        self._clamp_offset()
+
     def _clamp_offset(self):
-        max_offset = WORLD_WIDTH_PIXELS - self.screen_width
-        self.offset_x = max(0, min(self.offset_x, max_offset))
\ No newline at end of file
+        max_offset = self.max_x - self.screen_width
+        self.offset_x = max(self.min_x, min(self.offset_x, max_offset))
+
+    def visible_range(self):
+        return self.offset_x, self.offset_x + self.screen_width
@@ -0,0 +1,47 @@
+import pygame
+from settings import DIRTY_RECT_UPDATES, DIRTY_RECT_MAX_COVERAGE
+
+class DirtyRects:
+    # Screen areas drawn over this frame. The whole frame is still drawn, but while the camera holds
+    # still only these areas are pushed to the display. Each one is pushed again on the next frame too,
+    # so whatever moved away from it is cleared
+    def __init__(self, screen_size, enabled=DIRTY_RECT_UPDATES, max_coverage=DIRTY_RECT_MAX_COVERAGE):
+        self.screen_rect = pygame.Rect((0, 0), screen_size)
+        self.enabled = enabled
+        self.max_area = self.screen_rect.width * self.screen_rect.height * max_coverage
+        self.rects = []
+        self._previous = []
+        self._camera_x = None
+        self.full_updates = 0
+
+    def add(self, rect):
+        if rect:
+            self.rects.append(rect)
+
+    def extend(self, rects):
+        self.rects.extend(rect for rect in rects if rect)
+
+    def invalidate(self):
+        # The next present is a full flip, whatever changed
+        self._camera_x = None
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.invalidate()
+        return self.enabled
+
+    def present(self, camera_offset_x):
+        # Returns how many areas were pushed, or 0 when the whole screen was flipped
+        rects = [rect.clip(self.screen_rect) for rect in self._previous + self.rects]
+        rects = [rect for rect in rects if rect]
+        full = (not self.enabled or camera_offset_x != self._camera_x
+                or sum(rect.width * rect.height for rect in rects) > self.max_area)
+        self._previous, self.rects = self.rects, []
+        self._camera_x = camera_offset_x
+        if full:
+            pygame.display.flip()
+            self.full_updates += 1
+            return 0
+        if rects:
+            pygame.display.update(rects)
+        return len(rects)
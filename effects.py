@@ -0,0 +1,119 @@
+import re
+from collections import deque
+from settings import (UI_TEXT_COLOR, FLOATING_TEXT_MAX_PER_FRAME, FLOATING_TEXT_POOL_SIZE,
+                      FLOATING_TEXT_COALESCE_CELL, INCOME_RATE_WINDOW)
+from text_cache import render_text
+
+_AMOUNT_PATTERN = re.compile(r'^([+-])(\d+)$')
+
+class FloatingText:
+    def __init__(self, x, y, text, font, duration=1.5, speed=20, color=UI_TEXT_COLOR):
+        self.reset(x, y, text, font, duration, speed, color)
+
+    def reset(self, x, y, text, font, duration=1.5, speed=20, color=UI_TEXT_COLOR):
+        self.x = x
+        self.y = y
+        self.font = font
+        self.text = text
+        self.color = color
+        # Fades through every alpha, so it fades its own copy rather than the shared cached surface
+        self.surface = render_text(self.font, self.text, True, self.color).copy()
+        self.alpha = 255
+        self.duration = duration
+        self.timer = self.duration
+        self.speed = speed
+
+    def update(self, delta_time):
+        self.timer -= delta_time
+        self.y -= self.speed * delta_time
+        self.alpha = max(0, 255 * (self.timer / self.duration))
+        if self.timer <= 0: return False
+        return True
+
+    def draw(self, screen, camera_offset_x):
+        self.surface.set_alpha(self.alpha)
+        return screen.blit(self.surface, (self.x - camera_offset_x, self.y))
+
+class EffectPipeline:
+    MODES = ('popups', 'rates')
+
+    def __init__(self, font, max_per_frame=FLOATING_TEXT_MAX_PER_FRAME, pool_size=FLOATING_TEXT_POOL_SIZE):
+        self.font = font
+        self.max_per_frame = max_per_frame
+        self.pool_size = pool_size
+        self.mode = 'popups'
+        self.active = []
+        self._pool = []
+        self._pending_amounts = {}
+        self._pending_texts = []
+        self._income = deque()
+        self._income_total = 0
+        self.time = 0.0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def toggle_mode(self):
+        self.mode = self.MODES[(self.MODES.index(self.mode) + 1) % len(self.MODES)]
+        return self.mode
+
+    def add(self, x, y, text, duration=1.5):
+        match = _AMOUNT_PATTERN.match(text)
+        if not match:
+            self._pending_texts.append((x, y, text, duration))
+            return
+
+        amount = int(match.group(2)) if match.group(1) == '+' else -int(match.group(2))
+        if self.mode == 'rates':
+            if amount > 0:
+                self._income.append((self.time, amount))
+                self._income_total += amount
+            return
+
+        # Amounts landing in the same cell this frame become a single popup
+        key = (int(x) // FLOATING_TEXT_COALESCE_CELL, int(y) // FLOATING_TEXT_COALESCE_CELL, amount > 0)
+        pending = self._pending_amounts.get(key)
+        if pending:
+            pending[2] += amount
+            self.coalesced += 1
+        else:
+            self._pending_amounts[key] = [x, y, amount, duration]
+
+    def income_rate(self):
+        return self._income_total / INCOME_RATE_WINDOW
+
+    def update(self, delta_time):
+        self.time += delta_time
+        self._flush()
+
+        kept = 0
+        for ft in self.active:
+            if ft.update(delta_time):
+                self.active[kept] = ft
+                kept += 1
+            elif len(self._pool) < self.pool_size:
+                self._pool.append(ft)
+        del self.active[kept:]
+
+        while self._income and self._income[0][0] < self.time - INCOME_RATE_WINDOW:
+            self._income_total -= self._income.popleft()[1]
+
+    def _flush(self):
+        # Notifications are never capped; amount popups beyond the per-frame cap are dropped
+        for x, y, text, duration in self._pending_texts:
+            self._spawn(x, y, text, duration)
+        self._pending_texts.clear()
+
+        for spawned, (x, y, amount, duration) in enumerate(self._pending_amounts.values()):
+            if spawned >= self.max_per_frame:
+                self.dropped += len(self._pending_amounts) - spawned
+                break
+            self._spawn(x, y, f"{amount:+d}", duration)
+        self._pending_amounts.clear()
+
+    def _spawn(self, x, y, text, duration):
+        if self._pool:
+            ft = self._pool.pop()
+            ft.reset(x, y, text, self.font, duration=duration)
+        else:
+            ft = FloatingText(x, y, text, self.font, duration=duration)
+        self.active.append(ft)
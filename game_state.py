@@ -1,13 +1,20 @@
-import pygame
+import random
 from settings import (GLIM_COST, WELLSPRING_COST, BEACON_COST, STOMPER_POST_COST, 
                       STRUCTURE_REFUND_PERCENTAGE)
-from glim import Glim
+from swarm import GlimSwarm
+from spatial import BeaconIndex
+from structure import Beacon
+from scheduler import Scheduler
 
 class GameState:
-    def __init__(self):
+    def __init__(self, scheduler=None, glims=None, rng=None):
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
+        # Everything random in play draws from this, so a seeded game replays exactly
+        self.rng = rng if rng is not None else random.Random()
         self.life_essence = 54770
-        self.glims = []
+        self.glims = glims if glims is not None else GlimSwarm(rng=self.rng)
         self.structures = []
+        self.beacon_index = BeaconIndex()
         self.glim_cap = 10457457
         
         self.build_mode_item = None
@@ -61,7 +68,7 @@ class GameState:
         has_sp = self.skill_points >= skill['cost_sp']
         has_essence = self.life_essence >= skill['cost_essence']
         
-        standard_glim_count = sum(1 for glim in self.glims if glim.glim_type == 'standard')
+        standard_glim_count = self.glims.count_of('standard')
         has_glims = standard_glim_count >= skill['req_glims']
         
         return has_sp and has_essence and has_glims
@@ -76,14 +83,14 @@ class GameState:
             if skill_name == 'glimdraulic_drills':
                 for _ in range(5):
                     if len(self.glims) < self.glim_cap:
-                        self.glims.append(Glim(*center_pos, glim_type='stomper'))
+                        self.glims.add(*center_pos, glim_type='stomper')
             return True
         return False
 
     def purchase_glim(self, x, y):
         if self.can_purchase("glim"):
             self.life_essence -= GLIM_COST
-            self.glims.append(Glim(x, y, glim_type='standard'))
+            self.glims.add(x, y, glim_type='standard')
     
     def place_structure(self, structure_class, tile):
         item_name = structure_class.__name__.lower()
@@ -94,10 +101,25 @@ class GameState:
                 "stompertrainingpost": STOMPER_POST_COST
             }
             self.life_essence -= cost_map.get(item_name, 0)
-            new_structure = structure_class(tile)
-            self.structures.append(new_structure)
+            self.add_structure(structure_class(tile))
             self.build_mode_item = None
-            pygame.mouse.set_visible(True)
+
+    def add_structure(self, structure):
+        self.structures.append(structure)
+        if isinstance(structure, Beacon):
+            self.beacon_index.add(structure.tile)
+        if getattr(structure, 'glim_to_train', None) is not None:
+            self.glims.claim_untrained(structure.glim_to_train) # A loaded post keeps the Glim it was training
+        structure.start(self.scheduler, self)
+
+    def detach_structure(self, structure):
+        structure.stop()
+        if getattr(structure, 'glim_to_train', None) is not None:
+            self.glims.release_untrained(structure.glim_to_train)
+        structure.tile.structure = None
+        self.structures.remove(structure)
+        if isinstance(structure, Beacon):
+            self.beacon_index.remove(structure.tile)
 
     def remove_structure(self, structure_to_remove):
         cost_map = {
@@ -108,19 +130,9 @@ class GameState:
         cost = cost_map.get(structure_to_remove.name, 0)
         refund = round(cost * STRUCTURE_REFUND_PERCENTAGE)
         self.add_essence(refund)
-
-        structure_to_remove.tile.structure = None
-        self.structures.remove(structure_to_remove)
+        self.detach_structure(structure_to_remove)
         return refund
 
-    def find_trainable_glim(self):
-        for glim in self.glims:
-            if glim.glim_type == 'standard':
-                is_being_trained = False
-                for struct in self.structures:
-                    if hasattr(struct, 'glim_to_train') and struct.glim_to_train == glim:
-                        is_being_trained = True
-                        break
-                if not is_being_trained:
-                    return glim
-        return None
+    def claim_trainable_glim(self):
+        # The Glim is the caller's until it is converted or the post goes away
+        return self.glims.claim_untrained()
@@ -5,16 +5,48 @@ from settings import (GLIM_SPEED, GLIM_CULTIVATION_RATE, GLIM_CULTIVATION_STRENG
                       GLIM_MINING_STRENGTH, GLIM_COLOR_PALETTE, GLIM_EYE_COLOR, 
                       GLIM_PUPIL_COLOR, PI, STOMPER_LUNGE_DISTANCE, 
                       STOMPER_LUNGE_SPEED_MULTIPLIER, STOMPER_LUNGE_COOLDOWN)
+from atlas import atlas
+
+def create_glim_surface(color, glim_type):
+    is_stomper = glim_type == 'stomper'
+    size = (24, 24) if is_stomper else (16, 16)
+    surface = pygame.Surface(size, pygame.SRCALPHA)
+    
+    body_rect = (0, 6, size[0], size[1]-6) if is_stomper else (0, 4, 16, 12)
+    eye_y = 10 if is_stomper else 7
+    pupil_y = 12 if is_stomper else 9
+
+    pygame.draw.rect(surface, color, body_rect, border_radius=5)
+    
+    pygame.draw.rect(surface, GLIM_EYE_COLOR, (size[0]*0.18, eye_y, size[0]*0.25, size[1]*0.3), border_radius=2)
+    pygame.draw.rect(surface, GLIM_EYE_COLOR, (size[0]*0.56, eye_y, size[0]*0.25, size[1]*0.3), border_radius=2)
+    pygame.draw.rect(surface, GLIM_PUPIL_COLOR, (size[0]*0.25, pupil_y, size[0]*0.125, size[1]*0.125))
+    pygame.draw.rect(surface, GLIM_PUPIL_COLOR, (size[0]*0.625, pupil_y, size[0]*0.125, size[1]*0.125))
+    return surface
+
+def get_glim_surface(color_index, glim_type):
+    return atlas.get(('glim', color_index, glim_type), create_glim_surface, GLIM_COLOR_PALETTE[color_index], glim_type)
+
+def create_crowd_surface():
+    # A small heap of Glims stands in for a dense crowd
+    surface = pygame.Surface((32, 24), pygame.SRCALPHA)
+    for color, position in zip(GLIM_COLOR_PALETTE, ((0, 8), (16, 8), (8, 0))):
+        surface.blit(create_glim_surface(color, 'standard'), position)
+    return surface
+
+def get_crowd_surface():
+    return atlas.get(('glim', 'crowd'), create_crowd_surface)
 
 class Glim:
-    def __init__(self, x, y, glim_type='standard'):
+    def __init__(self, x, y, glim_type='standard', rng=random):
         self.x = x
         self.y = y
         self.glim_type = glim_type
         
         # Generic attributes
-        self.bob_timer = random.uniform(0, 2 * PI)
-        self.color = random.choice(GLIM_COLOR_PALETTE)
+        self.bob_timer = rng.uniform(0, 2 * PI)
+        self.color_index = rng.randrange(len(GLIM_COLOR_PALETTE))
+        self.color = GLIM_COLOR_PALETTE[self.color_index]
         self.surface = self._create_surface()
         self.current_target_tile = None
 
@@ -26,21 +58,7 @@ class Glim:
         self.lunge_origin_pos = None
 
     def _create_surface(self):
-        is_stomper = self.glim_type == 'stomper'
-        size = (24, 24) if is_stomper else (16, 16)
-        surface = pygame.Surface(size, pygame.SRCALPHA)
-        
-        body_rect = (0, 6, size[0], size[1]-6) if is_stomper else (0, 4, 16, 12)
-        eye_y = 10 if is_stomper else 7
-        pupil_y = 12 if is_stomper else 9
-
-        pygame.draw.rect(surface, self.color, body_rect, border_radius=5)
-        
-        pygame.draw.rect(surface, GLIM_EYE_COLOR, (size[0]*0.18, eye_y, size[0]*0.25, size[1]*0.3), border_radius=2)
-        pygame.draw.rect(surface, GLIM_EYE_COLOR, (size[0]*0.56, eye_y, size[0]*0.25, size[1]*0.3), border_radius=2)
-        pygame.draw.rect(surface, GLIM_PUPIL_COLOR, (size[0]*0.25, pupil_y, size[0]*0.125, size[1]*0.125))
-        pygame.draw.rect(surface, GLIM_PUPIL_COLOR, (size[0]*0.625, pupil_y, size[0]*0.125, size[1]*0.125))
-        return surface
+        return get_glim_surface(self.color_index, self.glim_type)
 
     def convert_to_stomper(self):
         self.glim_type = 'stomper'
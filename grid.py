@@ -1,98 +1,516 @@
-import math
-from tile import Tile
-from structure import Beacon
-from settings import (WORLD_SIZE_TILES, TILE_SIZE, BASE_TOUGHNESS, TOUGHNESS_MULTIPLIER, 
-                      GROUND_Y_OFFSET_BLOCKS, ACTIVE_ZONE_RADIUS, CORE_TILE_INDEX, 
-                      CORE_TILE_TOUGHNESS, BEACON_SPEED_BOOST, MOUNTAIN_TOUGHNESS, BEACON_RANGE,
-                      BEACON_STACK_MODIFIER, MAX_BEACON_BUFF)
+import bisect
+import random
+import numpy as np
+import pygame
+from tile import (Tile, TileArray, TILE_COLUMNS, STATE_BARREN, STATE_LIVING, STATE_MOUNTAIN, NO_STRUCTURE,
+                  toughness_at)
+from world import Chunk, TileRow, CHUNK_COUNT, create_living_chunk_surface
+from atlas import atlas
+from scheduler import Scheduler
+from settings import (WORLD_SIZE_TILES, TILE_SIZE, GROUND_Y_OFFSET_BLOCKS, ACTIVE_ZONE_RADIUS,
+                      CORE_TILE_INDEX, CORE_TILE_TOUGHNESS, MOUNTAIN_TOUGHNESS, PASSIVE_INCOME_AMOUNT,
+                      PASSIVE_INCOME_INTERVAL, MOUNTAIN_SILHOUETTES, WORLD_CHUNK_TILES,
+                      WORLD_GENERATE_MARGIN, WORLD_SEED, GLIM_FRONTIER_SPREAD)
 
 class Grid:
-    def __init__(self, screen_height):
-        self.tiles = []
+    def __init__(self, screen_height, scheduler=None, seed=WORLD_SEED):
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
+        self.seed = seed
         self.ground_y = screen_height - (GROUND_Y_OFFSET_BLOCKS * TILE_SIZE)
-        self.center_tile_pos = (0, 0)
         self.center_index = WORLD_SIZE_TILES // 2
-        self._create_tiles()
-        self.tiles[self.center_index].state = 'living'
-        self.tiles[self.center_index].current_toughness = 0
-
-    def _create_tiles(self):
-        core_tile_abs_index = self.center_index + CORE_TILE_INDEX
-        for i in range(WORLD_SIZE_TILES):
-            is_center = (i == self.center_index)
-            is_core = (i == core_tile_abs_index)
+        self.core_index = self.center_index + CORE_TILE_INDEX
+        self.center_tile_pos = (self.center_index * TILE_SIZE + TILE_SIZE // 2, self.ground_y)
+        self.tiles = TileRow(self)
+
+        # Generated chunks always form one run, first_chunk..last_chunk - 1, grown as the frontier
+        # or the camera approaches its ends
+        self.chunks = {}
+        self.first_chunk = self.last_chunk = self.center_index // WORLD_CHUNK_TILES
+        self.barren_indices = []
+        self.mountain_indices = []
+        self._mountain_array = None
+        self._frontier_arrays = {}
+        self._near = None
+        self._layout_changed = True
+        self._changed_chunks = set() # Chunks to recheck for compression; all of them when _recheck_all
+        self._recheck_all = True
+
+        # Each loaded chunk is rendered once into its own strip; only dirty tiles are redrawn
+        self.strip_top = self.ground_y - 3 * TILE_SIZE
+        self._dirty_tiles = []
+        self.redrawn_rects = [] # Screen areas the last draw changed, at the same camera offset
+        self._drawn_strips = []
+
+        # Each earning tile has one pending income event, and each compressed chunk one for all of
+        # its tiles; column timers are only synced on demand
+        self._passive_events = {}
+        self._chunk_events = {}
+        self._passive_suspended = False
+        # While suspended, passive time can be deferred: each chunk is only worked out up to the clock when
+        # its earning tiles change or its income is collected
+        self._passive_clock = 0.0
+        self._passive_payouts = 0
+
+        self.maintain_chunks()
+        self._update_frontiers()
+
+    @property
+    def first_tile(self):
+        return self.first_chunk * WORLD_CHUNK_TILES
+
+    @property
+    def end_tile(self):
+        return min(self.last_chunk * WORLD_CHUNK_TILES, WORLD_SIZE_TILES)
+
+    def _generate(self, chunk):
+        # Seeded per chunk, so a chunk comes out the same whenever and in whatever order it is generated
+        rng = random.Random(f"{self.seed}:{chunk.index}")
+        tile_array = TileArray(chunk.size)
+        tiles = []
+        for slot in range(chunk.size):
+            i = chunk.first + slot
             distance_from_center = abs(i - self.center_index)
-            
-            toughness = round(BASE_TOUGHNESS * (TOUGHNESS_MULTIPLIER ** distance_from_center))
-            if is_core: toughness = CORE_TILE_TOUGHNESS
-            
-            x_pos = i * TILE_SIZE
+            toughness = CORE_TILE_TOUGHNESS if i == self.core_index else toughness_at(distance_from_center)
             state = 'barren'
             if distance_from_center > ACTIVE_ZONE_RADIUS:
                 state = 'mountain'
                 toughness = MOUNTAIN_TOUGHNESS
 
-            self.tiles.append(Tile(x_pos, self.ground_y, toughness, state, is_center, is_core, distance_from_center))
-            if is_center:
-                self.center_tile_pos = (self.tiles[i].rect.centerx, self.tiles[i].rect.top)
+            tile = Tile(i * TILE_SIZE, self.ground_y, toughness, state, i == self.center_index, i == self.core_index,
+                        distance_from_center, tile_array, slot, rng.randrange(MOUNTAIN_SILHOUETTES))
+            if tile.is_center:
+                tile.state = 'living'
+                tile.current_toughness = 0
+            tile.on_dirty = self._dirty_tiles.append
+            tile.on_state_change = self._on_tile_state_change
+            tile.on_structure_change = self._on_tile_structure_change
+            tiles.append(tile)
+        chunk.tile_array = tile_array
+        chunk.tiles = tiles
+
+    def _living_columns(self, chunk):
+        # The columns a compressed chunk stands for: every tile living, sharing the chunk's timer
+        indices = range(chunk.first, chunk.first + chunk.size)
+        max_toughness = [CORE_TILE_TOUGHNESS if i == self.core_index else toughness_at(abs(i - self.center_index))
+                         for i in indices]
+        return {
+            'state': np.full(chunk.size, STATE_LIVING, dtype=np.int8),
+            'current_toughness': np.zeros(chunk.size, dtype=np.int64),
+            'max_toughness': np.array(max_toughness, dtype=np.int64),
+            'passive_timer': np.full(chunk.size, chunk.passive_timer),
+        }
+
+    def _index_chunk(self, chunk):
+        states = chunk.tile_array.state
+        for state, indices in ((STATE_BARREN, self.barren_indices), (STATE_MOUNTAIN, self.mountain_indices)):
+            for slot in np.flatnonzero(states == state).tolist():
+                bisect.insort(indices, chunk.first + slot)
+        self._mountain_array = None
+        self._frontier_arrays = {}
+        for slot in chunk.tile_array.earning().nonzero()[0].tolist():
+            self._refresh_passive(chunk.first + slot)
+
+    def _unindex_chunk(self, chunk):
+        for indices in (self.barren_indices, self.mountain_indices):
+            del indices[bisect.bisect_left(indices, chunk.first):bisect.bisect_left(indices, chunk.first + chunk.size)]
+        self._mountain_array = None
+        self._frontier_arrays = {}
+        for i in range(chunk.first, chunk.first + chunk.size):
+            event = self._passive_events.pop(i, None)
+            if event is not None:
+                chunk.tile_array.passive_timer[i - chunk.first] = PASSIVE_INCOME_INTERVAL - self.scheduler.remaining(event)
+                self.scheduler.cancel(event)
+
+    def _extend_to(self, first_chunk, last_chunk):
+        while self.first_chunk > first_chunk:
+            self.first_chunk -= 1
+            self._add_chunk(self.first_chunk)
+        while self.last_chunk < last_chunk:
+            self._add_chunk(self.last_chunk)
+            self.last_chunk += 1
+
+    def _add_chunk(self, index):
+        chunk = self.chunks[index] = Chunk(index)
+        chunk.passive_settled = self._passive_clock
+        self._generate(chunk)
+        self._index_chunk(chunk)
+
+    def _drop_chunk(self, chunk):
+        self._unindex_chunk(chunk)
+        del self.chunks[chunk.index]
+
+    def _compress(self, chunk):
+        # The chunk's tiles go on earning as one, from the mean of their timers
+        self._settle_passive(chunk)
+        self._unindex_chunk(chunk)
+        chunk.passive_timer = float(chunk.tile_array.passive_timer.mean())
+        chunk.tile_array = chunk.tiles = chunk.surface = None
+        self._refresh_chunk_passive(chunk)
+
+    def _expand(self, chunk):
+        event = self._chunk_events.pop(chunk.index, None)
+        if event is not None:
+            chunk.passive_timer = PASSIVE_INCOME_INTERVAL - self.scheduler.remaining(event)
+            self.scheduler.cancel(event)
+        self._settle_passive(chunk)
+        self._generate(chunk)
+        chunk.tile_array.load_columns(self._living_columns(chunk))
+        self._index_chunk(chunk)
+        self._changed_chunks.add(chunk.index)
+        self._layout_changed = True
+
+    def tile(self, index):
+        if not 0 <= index < WORLD_SIZE_TILES:
+            raise IndexError(f"Tile {index} is outside the world")
+        chunk_index = index // WORLD_CHUNK_TILES
+        if not self.first_chunk <= chunk_index < self.last_chunk:
+            self._extend_to(min(self.first_chunk, chunk_index), max(self.last_chunk, chunk_index + 1))
+            self._layout_changed = True
+        chunk = self.chunks[chunk_index]
+        if not chunk.loaded:
+            self._expand(chunk)
+        return chunk.tiles[index - chunk.first]
+
+    def loaded_tiles(self):
+        for chunk_index in range(self.first_chunk, self.last_chunk):
+            chunk = self.chunks[chunk_index]
+            if chunk.loaded:
+                yield from chunk.tiles
+
+    def tile_states(self):
+        return np.concatenate([chunk.tile_array.state if chunk.loaded else np.full(chunk.size, STATE_LIVING, dtype=np.int8)
+                               for chunk in self._chunks_between(self.first_tile, self.end_tile)])
+
+    def chunk_counts(self):
+        loaded = sum(chunk.loaded for chunk in self.chunks.values())
+        return loaded, len(self.chunks) - loaded
+
+    def set_view(self, x0, x1):
+        # Returns whether the range of chunks kept around the camera moved
+        chunk_width = WORLD_CHUNK_TILES * TILE_SIZE
+        near = (int(x0 // chunk_width) - WORLD_GENERATE_MARGIN, int(x1 // chunk_width) + WORLD_GENERATE_MARGIN + 1)
+        if near == self._near:
+            return False
+        self._near = near
+        self._layout_changed = self._recheck_all = True
+        self.maintain_chunks()
+        return True
+
+    def pixel_bounds(self):
+        return self.first_tile * TILE_SIZE, self.end_tile * TILE_SIZE
+
+    def _required_chunks(self):
+        margin = WORLD_GENERATE_MARGIN
+        center_chunk = self.center_index // WORLD_CHUNK_TILES
+        pos = bisect.bisect_left(self.mountain_indices, self.center_index)
+        left = self.mountain_indices[pos - 1] // WORLD_CHUNK_TILES if pos > 0 else self.first_chunk
+        right = self.mountain_indices[pos] // WORLD_CHUNK_TILES if pos < len(self.mountain_indices) else self.last_chunk - 1
+        first, last = min(left - margin, center_chunk), max(right + margin + 1, center_chunk + 1)
+        if self._near is not None:
+            first, last = min(first, self._near[0]), max(last, self._near[1])
+        return max(first, 0), min(last, CHUNK_COUNT)
+
+    def maintain_chunks(self):
+        # Generates a margin of chunks past the innermost mountain on each side and around the camera,
+        # drops untouched mountain chunks that fall outside that again, and compresses fully living
+        # chunks away from the camera. Only tile state changes and camera moves can change any of that, and
+        # a tile change only needs its own chunk looked at again
+        if not self._layout_changed:
+            return
+        # New chunks can hold the innermost mountains, which moves what is required, so settle that first
+        first, last = self._required_chunks()
+        while self.first_chunk > first or self.last_chunk < last:
+            self._extend_to(first, last)
+            first, last = self._required_chunks()
+        near = self._near
+
+        while self.first_chunk < first and self.chunks[self.first_chunk].loaded and self.chunks[self.first_chunk].is_pristine():
+            self._drop_chunk(self.chunks[self.first_chunk])
+            self.first_chunk += 1
+        while self.last_chunk > last and self.chunks[self.last_chunk - 1].loaded and self.chunks[self.last_chunk - 1].is_pristine():
+            self._drop_chunk(self.chunks[self.last_chunk - 1])
+            self.last_chunk -= 1
+
+        if self._recheck_all:
+            chunks = list(self.chunks.values())
+        else:
+            chunks = [self.chunks[i] for i in self._changed_chunks if i in self.chunks]
+        for chunk in chunks:
+            in_view = near is not None and near[0] <= chunk.index < near[1]
+            if in_view and not chunk.loaded:
+                self._expand(chunk)
+            elif not in_view and chunk.loaded:
+                chunk.surface = None # Strips are only kept for chunks around the camera
+                if chunk.can_compress():
+                    self._compress(chunk)
+        self._changed_chunks.clear()
+        self._layout_changed = self._recheck_all = False
+
+    def check_span(self, first_tile, length):
+        if first_tile < 0 or first_tile + length > WORLD_SIZE_TILES:
+            raise ValueError(f"Saved world spans tiles {first_tile}..{first_tile + length - 1}, "
+                             f"outside 0..{WORLD_SIZE_TILES - 1}")
+
+    def load_tile_columns(self, columns, first_tile):
+        length = len(columns['state'])
+        self.check_span(first_tile, length)
+        for event in list(self._passive_events.values()) + list(self._chunk_events.values()):
+            self.scheduler.cancel(event)
+        self._passive_events.clear()
+        self._chunk_events.clear()
+        self.chunks.clear()
+        self.barren_indices.clear()
+        self.mountain_indices.clear()
+        self._mountain_array = None
+        self._frontier_arrays = {}
+        self._dirty_tiles.clear()
+
+        # Saved tiles are laid over freshly generated chunks, which fill in any partial chunk at the ends
+        self.first_chunk = self.last_chunk = first_tile // WORLD_CHUNK_TILES
+        for chunk_index in range(self.first_chunk, -(-(first_tile + length) // WORLD_CHUNK_TILES)):
+            chunk = self.chunks[chunk_index] = Chunk(chunk_index)
+            chunk.passive_settled = self._passive_clock
+            self._generate(chunk)
+            lo = max(first_tile, chunk.first)
+            hi = min(first_tile + length, chunk.first + chunk.size)
+            for name in TILE_COLUMNS:
+                getattr(chunk.tile_array, name)[lo - chunk.first:hi - chunk.first] = columns[name][lo - first_tile:hi - first_tile]
+            self._index_chunk(chunk)
+            self.last_chunk = chunk_index + 1
+        self._update_frontiers()
+        self._layout_changed = self._recheck_all = True
+        self.maintain_chunks()
+
+    def mountain_array(self):
+        # The swarm looks mountains up every tick, so the array is only rebuilt when the list changes
+        if self._mountain_array is None:
+            self._mountain_array = np.array(self.mountain_indices, dtype=np.int32)
+        return self._mountain_array
+
+    def frontier_array(self, targeting_mode):
+        # The barren tiles standard Glims are spread over, nearest the center first: the next
+        # GLIM_FRONTIER_SPREAD from the right frontier outwards, and from the left one too once Glims may go
+        # either way. The first is always the tile find_standard_target picks
+        frontier = self._frontier_arrays.get(targeting_mode)
+        if frontier is None:
+            pos = bisect.bisect_left(self.barren_indices, self.center_index)
+            tiles = self.barren_indices[pos:pos + GLIM_FRONTIER_SPREAD] if targeting_mode in ('right_only', 'closest') else []
+            if targeting_mode == 'closest':
+                tiles += self.barren_indices[max(pos - GLIM_FRONTIER_SPREAD, 0):pos]
+            # Ties go right, like closest_frontier
+            tiles.sort(key=lambda i: (abs(i - self.center_index), i < self.center_index))
+            frontier = self._frontier_arrays[targeting_mode] = np.array(tiles, dtype=np.int32)
+        return frontier
+
+    def _chunk_at(self, index):
+        chunk = self.chunks.get(index // WORLD_CHUNK_TILES)
+        return chunk if chunk is not None and chunk.loaded else None
+
+    def _chunks_between(self, first, last):
+        if first >= last:
+            return []
+        return [self.chunks[i] for i in range(first // WORLD_CHUNK_TILES, -(-last // WORLD_CHUNK_TILES))]
+
+    def _on_tile_state_change(self, tile, old_state):
+        index = tile.x_pos // TILE_SIZE
+        self._settle_before_change(index, old_state == 'living' and not tile.is_center and tile.structure is None)
+        for state, indices in (('barren', self.barren_indices), ('mountain', self.mountain_indices)):
+            if old_state == state:
+                del indices[bisect.bisect_left(indices, index)]
+            if tile.state == state:
+                bisect.insort(indices, index)
+        if 'mountain' in (old_state, tile.state):
+            self._mountain_array = None
+        self._frontier_arrays = {}
+        self._update_frontiers()
+        self._refresh_passive(index)
+        self._changed_chunks.add(index // WORLD_CHUNK_TILES)
+        self._layout_changed = True
+
+    def _on_tile_structure_change(self, tile):
+        index = tile.x_pos // TILE_SIZE
+        chunk = self._chunk_at(index)
+        if chunk is None or chunk.tiles[index - chunk.first] is not tile:
+            return # A tile from a world that has since been replaced
+        # A structure is only ever placed on an empty tile or taken off again, so this one just flipped
+        self._settle_before_change(index, tile.state == 'living' and not tile.is_center and tile.structure is not None)
+        self._refresh_passive(index)
+        self._changed_chunks.add(chunk.index)
+        self._layout_changed = True
+
+    def _refresh_passive(self, index):
+        if self._passive_suspended:
+            return
+        chunk = self._chunk_at(index)
+        tile_array, slot = chunk.tile_array, index - chunk.first
+        earning = (tile_array.state[slot] == STATE_LIVING and not tile_array.is_center[slot]
+                   and tile_array.structure_ids[slot] == NO_STRUCTURE)
+        event = self._passive_events.get(index)
+        if earning and event is None:
+            delay = PASSIVE_INCOME_INTERVAL - tile_array.passive_timer[slot]
+            self._passive_events[index] = self.scheduler.schedule(delay, self._pay_passive, index)
+        elif not earning and event is not None:
+            # The timer pauses while the tile is not earning, as it did when it was polled
+            tile_array.passive_timer[slot] = PASSIVE_INCOME_INTERVAL - self.scheduler.remaining(event)
+            self.scheduler.cancel(event)
+            del self._passive_events[index]
+
+    def _refresh_chunk_passive(self, chunk):
+        if not self._passive_suspended and chunk.index not in self._chunk_events:
+            delay = PASSIVE_INCOME_INTERVAL - chunk.passive_timer
+            self._chunk_events[chunk.index] = self.scheduler.schedule(delay, self._pay_chunk, chunk)
+
+    def _pay_passive(self, index):
+        chunk = self._chunk_at(index)
+        chunk.tile_array.passive_timer[index - chunk.first] = 0.0
+        self._passive_events[index] = self.scheduler.schedule(PASSIVE_INCOME_INTERVAL, self._pay_passive, index)
+        x = index * TILE_SIZE + TILE_SIZE // 2
+        return PASSIVE_INCOME_AMOUNT, {'x': x, 'y': self.ground_y, 'text': f"+{PASSIVE_INCOME_AMOUNT}"}
+
+    def _pay_chunk(self, chunk):
+        chunk.passive_timer = 0.0
+        self._chunk_events[chunk.index] = self.scheduler.schedule(PASSIVE_INCOME_INTERVAL, self._pay_chunk, chunk)
+        amount = PASSIVE_INCOME_AMOUNT * chunk.size
+        x = chunk.first * TILE_SIZE + chunk.size * TILE_SIZE // 2
+        return amount, {'x': x, 'y': self.ground_y, 'text': f"+{amount}"}
+
+    def sync_passive_timers(self):
+        for index, event in self._passive_events.items():
+            chunk = self._chunk_at(index)
+            chunk.tile_array.passive_timer[index - chunk.first] = PASSIVE_INCOME_INTERVAL - self.scheduler.remaining(event)
+        for chunk_index, event in self._chunk_events.items():
+            self.chunks[chunk_index].passive_timer = PASSIVE_INCOME_INTERVAL - self.scheduler.remaining(event)
+
+    def _settle_passive(self, chunk, earning=None):
+        elapsed = self._passive_clock - chunk.passive_settled
+        chunk.passive_settled = self._passive_clock
+        if elapsed <= 0:
+            return
+        if chunk.loaded:
+            self._passive_payouts += chunk.tile_array.fast_forward_passive_income(elapsed, earning)
+        else:
+            elapsed += chunk.passive_timer
+            chunk_payouts = elapsed // PASSIVE_INCOME_INTERVAL
+            chunk.passive_timer = elapsed - chunk_payouts * PASSIVE_INCOME_INTERVAL
+            self._passive_payouts += int(chunk_payouts) * chunk.size
+
+    def _settle_before_change(self, index, was_earning):
+        # Deferred income is worked out with the tile as it was, but only if its earning flipped
+        chunk = self._chunk_at(index)
+        if chunk is None or chunk.passive_settled == self._passive_clock:
+            return
+        slot = index - chunk.first
+        earning = chunk.tile_array.earning()
+        if earning[slot] != was_earning:
+            earning[slot] = was_earning
+            self._settle_passive(chunk, earning)
+
+    def defer_passive(self, seconds):
+        # Only while suspended; the time is worked out chunk by chunk later, see collect_passive
+        self._passive_clock += seconds
+
+    def collect_passive(self):
+        # Returns the essence earned over all deferred time
+        for chunk in self.chunks.values():
+            self._settle_passive(chunk)
+        payouts, self._passive_payouts = self._passive_payouts, 0
+        return payouts * PASSIVE_INCOME_AMOUNT
+
+    def suspend_passive_events(self):
+        # While suspended the column timers are authoritative, e.g. across a long fast-forward
+        self.sync_passive_timers()
+        for event in list(self._passive_events.values()) + list(self._chunk_events.values()):
+            self.scheduler.cancel(event)
+        self._passive_events.clear()
+        self._chunk_events.clear()
+        self._passive_suspended = True
+
+    def resume_passive_events(self):
+        self._passive_suspended = False
+        self._reschedule_passive()
+
+    def _reschedule_passive(self):
+        for event in list(self._passive_events.values()) + list(self._chunk_events.values()):
+            self.scheduler.cancel(event)
+        self._passive_events.clear()
+        self._chunk_events.clear()
+        for chunk in self.chunks.values():
+            if chunk.loaded:
+                for slot in chunk.tile_array.earning().nonzero()[0].tolist():
+                    self._refresh_passive(chunk.first + slot)
+            else:
+                self._refresh_chunk_passive(chunk)
+
+    def tile_columns(self):
+        # Compressed chunks are written out in full, so a save does not depend on what was in view
+        self.sync_passive_timers()
+        parts = [chunk.tile_array.columns() if chunk.loaded else self._living_columns(chunk)
+                 for chunk in self._chunks_between(self.first_tile, self.end_tile)]
+        return {name: np.concatenate([part[name] for part in parts]) for name in TILE_COLUMNS}
+
+    def _update_frontiers(self):
+        # Nearest barren tile on each side of the center; the center itself is always living
+        pos = bisect.bisect_left(self.barren_indices, self.center_index)
+        self.right_frontier = self.barren_indices[pos] if pos < len(self.barren_indices) else None
+        self.left_frontier = self.barren_indices[pos - 1] if pos > 0 else None
+
+        self.closest_frontier = self.right_frontier
+        if self.left_frontier is not None:
+            right_dist = self.right_frontier - self.center_index if self.right_frontier is not None else float('inf')
+            if self.center_index - self.left_frontier < right_dist:
+                self.closest_frontier = self.left_frontier
 
     def find_next_target(self, glim, targeting_mode):
         if glim.glim_type == 'stomper':
-            closest_mountain = None
-            min_dist = float('inf')
-            for tile in self.tiles:
-                if tile.state == 'mountain':
-                    dist = abs(tile.rect.centerx - glim.x)
-                    if dist < min_dist:
-                        min_dist = dist
-                        closest_mountain = tile
-            return closest_mountain
-        
+            return self.find_closest_mountain(glim.x)
+        return self.find_standard_target(targeting_mode)
+
+    def find_standard_target(self, targeting_mode):
+        index = None
         if targeting_mode == 'right_only':
-            for i in range(self.center_index, len(self.tiles)):
-                if self.tiles[i].state == 'barren':
-                    return self.tiles[i]
+            index = self.right_frontier
         elif targeting_mode == 'closest':
-            for i in range(1, self.center_index + 1):
-                if self.center_index + i < len(self.tiles):
-                    right_tile = self.tiles[self.center_index + i]
-                    if right_tile.state == 'barren': return right_tile
-                if self.center_index - i >= 0:
-                    left_tile = self.tiles[self.center_index - i]
-                    if left_tile.state == 'barren': return left_tile
-        return None
-
-    def get_buff_at_tile(self, glim, structures):
-        beacons_in_range = []
-        for struct in structures:
-            if isinstance(struct, Beacon):
-                dist = math.hypot(struct.tile.rect.centerx - glim.x, struct.tile.rect.centery - glim.y)
-                if dist <= BEACON_RANGE:
-                    beacons_in_range.append(struct)
-        
-        if not beacons_in_range:
-            return 1.0
-
-        # Calculate buff with diminishing returns
-        total_boost = 0
-        base_boost = BEACON_SPEED_BOOST - 1.0
-        for i in range(len(beacons_in_range)):
-            total_boost += base_boost * (BEACON_STACK_MODIFIER ** i)
-
-        final_buff = 1.0 + total_boost
-        return min(final_buff, MAX_BEACON_BUFF)
+            index = self.closest_frontier
+        return self.tiles[index] if index is not None else None
+
+    def find_closest_mountain(self, x):
+        if not self.mountain_indices:
+            return None
+        pos = bisect.bisect_left(self.mountain_indices, (x - TILE_SIZE // 2) / TILE_SIZE)
+        candidates = self.mountain_indices[max(pos - 1, 0):pos + 1]
+        # Ties go to the lower index, like a left-to-right scan
+        closest = min(candidates, key=lambda i: abs(self.tiles[i].rect.centerx - x))
+        return self.tiles[closest]
+
+    def get_buff_at_tile(self, glim, beacon_index):
+        return beacon_index.buff_at(glim.x)
+
+    def get_buffs_at_positions(self, xs, beacon_index):
+        return beacon_index.buffs_at(xs)
+
+    def tile_index_at(self, world_x):
+        # Tiles sit in one row TILE_SIZE apart, so the column is plain arithmetic
+        return int(world_x // TILE_SIZE)
+
+    def tile_at(self, world_x, world_y):
+        # Only loaded tiles can be picked; a point over a compressed chunk or off the world finds nothing
+        index = self.tile_index_at(world_x)
+        chunk = self._chunk_at(index) if 0 <= index < WORLD_SIZE_TILES else None
+        if chunk is None:
+            return None
+        tile = chunk.tiles[index - chunk.first]
+        return tile if tile.rect.collidepoint(world_x, world_y) else None
+
+    def structure_at(self, world_x, world_y):
+        # A structure covers exactly its tile's rect
+        tile = self.tile_at(world_x, world_y)
+        return tile.structure if tile else None
 
     def get_tile_at_world_pos(self, world_x, world_y):
-        for tile in self.tiles:
-            if tile.rect.collidepoint(world_x, world_y):
-                return tile
-        return None
-    
-    def get_structure_at_world_pos(self, world_x, world_y, structures):
-        for struct in structures:
-            if struct.rect.collidepoint(world_x, world_y):
-                return struct
-        return None
+        return self.tile_at(world_x, world_y)
+
+    def get_structure_at_world_pos(self, world_x, world_y):
+        return self.structure_at(world_x, world_y)
 
     def handle_click(self, world_x, world_y, click_strength):
         tile = self.get_tile_at_world_pos(world_x, world_y)
@@ -101,16 +519,100 @@ class Grid:
         return 0
 
     def update(self, delta_time):
-        total_essence_gained = 0
-        effects_to_create = []
-        for tile in self.tiles:
-            essence, effect = tile.update(delta_time)
-            if essence > 0:
-                total_essence_gained += essence
-            if effect:
-                effects_to_create.append(effect)
-        return total_essence_gained, effects_to_create
+        # Passive income is paid by scheduler events; only the core tile's pulse is animated per frame
+        self.maintain_chunks()
+        chunk = self._chunk_at(self.core_index) if 0 <= self.core_index < WORLD_SIZE_TILES else None
+        if chunk is not None:
+            chunk.tiles[self.core_index - chunk.first].update_pulse(delta_time)
+
+    def fast_forward_passive(self, seconds):
+        suspended = self._passive_suspended
+        if not suspended:
+            self.suspend_passive_events()
+        self.defer_passive(seconds)
+        earned = self.collect_passive()
+        if not suspended:
+            self.resume_passive_events()
+        return earned
+
+    def _render_chunk(self, chunk):
+        chunk.surface = pygame.Surface((chunk.size * TILE_SIZE, 4 * TILE_SIZE), pygame.SRCALPHA)
+        self._redraw_strip(chunk, range(chunk.size))
+
+    def _redraw_strip(self, chunk, slots):
+        # Slots are cleared a run at a time. Clearing also wipes toughness text the tiles either side of a
+        # run spilled into it, so those are drawn again too, clipped to the run
+        strip = chunk.surface
+        slots = sorted(slots)
+        start = 0
+        for end in range(1, len(slots) + 1):
+            if end < len(slots) and slots[end] == slots[end - 1] + 1:
+                continue
+            area = pygame.Rect(slots[start] * TILE_SIZE, 0, (end - start) * TILE_SIZE, strip.get_height())
+            strip.fill((0, 0, 0, 0), area)
+            strip.set_clip(area)
+            for slot in range(max(slots[start] - 1, 0), min(slots[end - 1] + 2, chunk.size)):
+                chunk.tiles[slot].draw(strip, chunk.first * TILE_SIZE, self.strip_top)
+            strip.set_clip(None)
+            start = end
+        for slot in slots:
+            chunk.tiles[slot].dirty = False
+
+    def visible_tile_range(self, x0, x1):
+        first = max(int(x0 // TILE_SIZE), self.first_tile)
+        last = min(int(x1 // TILE_SIZE) + 1, self.end_tile)
+        return first, max(last, first)
+
+    def structures_in_range(self, x0, x1):
+        # Structures are found through the chunks' structure id columns, left to right
+        first, last = self.visible_tile_range(x0, x1)
+        structures = []
+        for chunk in self._chunks_between(first, last):
+            if chunk.loaded:
+                lo, hi = max(first - chunk.first, 0), last - chunk.first
+                tile_array = chunk.tile_array
+                ids = tile_array.structure_ids[lo:hi]
+                structures.extend(tile_array.structures[int(i)] for i in ids[ids != NO_STRUCTURE])
+        return structures
 
     def draw(self, screen, camera_offset_x):
-        for tile in self.tiles:
-            tile.draw(screen, camera_offset_x)
+        first, last = self.visible_tile_range(camera_offset_x, camera_offset_x + screen.get_width())
+        left = int(camera_offset_x)
+        self.redrawn_rects = []
+        if self._dirty_tiles:
+            # Off-screen tiles stay dirty until they scroll into view, and tiles of chunks without a
+            # strip are drawn along with the rest of the chunk. Neighbours are cleared too, since a
+            # tile's old toughness text can spill past its edge
+            slots_by_chunk = {}
+            offscreen = []
+            for tile in self._dirty_tiles:
+                i = tile.x_pos // TILE_SIZE
+                chunk = self.chunks.get(i // WORLD_CHUNK_TILES)
+                if chunk is None or chunk.surface is None or chunk.tiles[i - chunk.first] is not tile:
+                    continue
+                if first <= i < last:
+                    slot = i - chunk.first
+                    slots_by_chunk.setdefault(chunk, set()).update(s for s in (slot - 1, slot, slot + 1) if 0 <= s < chunk.size)
+                else:
+                    offscreen.append(tile)
+            self._dirty_tiles[:] = offscreen
+            for chunk, slots in slots_by_chunk.items():
+                self._redraw_strip(chunk, slots)
+                self.redrawn_rects.extend(pygame.Rect((chunk.first + slot) * TILE_SIZE - left, self.strip_top,
+                                                      TILE_SIZE, 4 * TILE_SIZE) for slot in slots)
+
+        drawn_strips = []
+        for chunk in self._chunks_between(first, last):
+            if chunk.loaded:
+                if chunk.surface is None:
+                    self._render_chunk(chunk)
+                strip = chunk.surface
+            else:
+                strip = atlas.get(('chunk', 'living', chunk.size), create_living_chunk_surface, chunk.size)
+            screen.blit(strip, (chunk.first * TILE_SIZE - left, self.strip_top))
+            drawn_strips.append(strip)
+        if drawn_strips != self._drawn_strips:
+            # A chunk was generated, rendered or compressed; the whole row is pushed
+            self.redrawn_rects = [pygame.Rect(0, self.strip_top, screen.get_width(), 4 * TILE_SIZE)]
+        self._drawn_strips = drawn_strips
+        return self.end_tile - self.first_tile - (last - first)
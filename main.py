@@ -1,11 +1,26 @@
+import os
+import time
 import pygame
-from settings import (SKY_COLOR, PLAYER_CLICK_STRENGTH, BUILD_VALID_COLOR, 
-                      BUILD_INVALID_COLOR, TILE_SIZE, DESTROY_VALID_COLOR)
-from grid import Grid
+import savegame
+from settings import (SKY_COLOR, BUILD_VALID_COLOR, 
+                      BUILD_INVALID_COLOR, TILE_SIZE, DESTROY_VALID_COLOR, PROFILE_TRACE_PATH,
+                      BEACON_RANGE, SAVE_PATH, OFFLINE_MAX_SECONDS, REPLAY_PATH)
 from camera import Camera
-from game_state import GameState
 from ui import UI
+from sim import Simulation
+from profiler import FrameProfiler
+from text_cache import text_cache
+from atlas import atlas
 from structure import Wellspring, Beacon, StomperTrainingPost
+from replay import ReplayRecorder
+from dirty import DirtyRects
+
+def show_effects(ui, effects):
+    for effect in effects:
+        if effect.get('type') == 'notification':
+            ui.show_notification(effect['text'])
+        else:
+            ui.add_floating_text(effect.get('x', 0), effect.get('y', 0), effect.get('text', ''))
 
 def main():
     pygame.init()
@@ -15,171 +30,161 @@ def main():
     pygame.display.set_caption("Glim Grid")
     clock = pygame.time.Clock()
 
-    game_state = GameState()
-    ui = UI(game_state, screen_width, screen_height)
-    grid = Grid(screen_height)
+    profiler = FrameProfiler()
+    sim = Simulation(screen_height, profiler=profiler)
+    game_state, grid = sim.game_state, sim.grid
+    ui = UI(game_state, screen_width, screen_height, profiler)
     camera = Camera(screen_width)
+    dirty = DirtyRects(screen.get_size())
+    autosaver = savegame.Autosaver(SAVE_PATH)
+    if os.path.exists(SAVE_PATH):
+        try:
+            header = savegame.load(sim, SAVE_PATH, mapped=False)
+            away = min(max(time.time() - header.get('saved_at', time.time()), 0.0), OFFLINE_MAX_SECONDS)
+            report = sim.fast_forward(away)
+            ui.show_notification(f"While you were away: +{report['essence']} essence")
+        except (OSError, ValueError, KeyError) as error:
+            ui.show_notification(f"Could not load save: {error}")
     build_preview_surface = None
 
     running = True
     while running:
         delta_time = clock.tick(60) / 1000.0
+        profiler.begin_frame()
         events = pygame.event.get()
         mouse_pos = pygame.mouse.get_pos()
         world_x, world_y = mouse_pos[0] + camera.offset_x, mouse_pos[1]
 
-        for event in events:
-            if event.type == pygame.QUIT: running = False
-            
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
-                    if game_state.build_mode_item or game_state.destroy_mode:
-                        game_state.build_mode_item = None
-                        game_state.destroy_mode = False
-                        pygame.mouse.set_visible(True)
-                    elif ui.build_menu_open: ui.build_menu_open = False
-                    elif ui.skill_tree_open: ui.skill_tree_open = False
-                    else: running = False
-                if event.key == pygame.K_1:
-                    ui.build_menu_open = not ui.build_menu_open
-                    ui.skill_tree_open = False
-                if event.key == pygame.K_2:
-                    if game_state.skill_tree_unlocked:
-                        ui.skill_tree_open = not ui.skill_tree_open
-                        ui.build_menu_open = False
-                if event.key == pygame.K_DELETE:
-                    game_state.destroy_mode = not game_state.destroy_mode
+        with profiler.scope('input'):
+            for event in events:
+                if event.type == pygame.QUIT: running = False
             
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                if event.button == 1: # Left Click
-                    # Handle destroy mode first
-                    if game_state.destroy_mode:
-                        structure_to_destroy = grid.get_structure_at_world_pos(world_x, world_y, game_state.structures)
-                        if structure_to_destroy:
-                            refund = game_state.remove_structure(structure_to_destroy)
-                            ui.show_notification(f"Structure sold for {refund} essence.")
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_ESCAPE:
+                        if game_state.build_mode_item or game_state.destroy_mode:
+                            game_state.build_mode_item = None
                             game_state.destroy_mode = False
-                        continue # Skip other click actions
+                            pygame.mouse.set_visible(True)
+                        elif ui.build_menu_open: ui.build_menu_open = False
+                        elif ui.skill_tree_open: ui.skill_tree_open = False
+                        else: running = False
+                    if event.key == pygame.K_1:
+                        ui.build_menu_open = not ui.build_menu_open
+                        ui.skill_tree_open = False
+                    if event.key == pygame.K_2:
+                        if game_state.skill_tree_unlocked:
+                            ui.skill_tree_open = not ui.skill_tree_open
+                            ui.build_menu_open = False
+                    if event.key == pygame.K_DELETE:
+                        game_state.destroy_mode = not game_state.destroy_mode
+                    if event.key == pygame.K_F3:
+                        profiler.enabled = not profiler.enabled
+                        ui.show_profiler = profiler.enabled
+                    if event.key == pygame.K_F5:
+                        mode = ui.effects.toggle_mode()
+                        ui.show_notification(f"Income display: {mode}")
+                    if event.key == pygame.K_F4 and profiler.trace:
+                        profiler.export(f"{PROFILE_TRACE_PATH}.csv")
+                        path = profiler.export(f"{PROFILE_TRACE_PATH}.json")
+                        ui.show_notification(f"Profile trace saved to {path}")
+                    if event.key == pygame.K_F6:
+                        if sim.recorder:
+                            path = sim.recorder.finish()
+                            sim.recorder = None
+                            ui.show_notification(f"Replay saved to {path}")
+                        else:
+                            sim.recorder = ReplayRecorder(sim, REPLAY_PATH)
+                            ui.show_notification("Recording replay")
+                    if event.key == pygame.K_F7:
+                        ui.show_notification(f"Dirty-rect updates: {'on' if dirty.toggle() else 'off'}")
+            
+                if event.type == pygame.MOUSEBUTTONDOWN:
+                    if event.button == 1: # Left Click
+                        # Handle destroy mode first
+                        if game_state.destroy_mode:
+                            destroyed = sim.apply_input('destroy', world_x, world_y)
+                            if destroyed:
+                                show_effects(ui, destroyed)
+                                game_state.destroy_mode = False
+                            continue # Skip other click actions
 
-                    action = ui.handle_click(mouse_pos)
+                        action = ui.handle_click(mouse_pos)
                     
-                    if action == "toggle_destroy_mode": pass # Handled by UI
-                    elif action == "purchase_glim": game_state.purchase_glim(*grid.center_tile_pos)
-                    elif action == "build_wellspring":
-                        if game_state.can_purchase("wellspring"):
-                            game_state.build_mode_item = "wellspring"
-                            build_preview_surface = Wellspring.get_preview_surface()
-                            ui.build_menu_open = False
-                    elif action == "build_beacon":
-                        if game_state.can_purchase("beacon"):
-                            game_state.build_mode_item = "beacon"
-                            build_preview_surface = Beacon.get_preview_surface()
-                            ui.build_menu_open = False
-                    elif action == "build_stomper_post":
-                        if game_state.can_purchase("stompertrainingpost"):
-                            game_state.build_mode_item = "stomper_post"
-                            build_preview_surface = StomperTrainingPost.get_preview_surface()
-                            ui.build_menu_open = False
-                    elif action == "purchase_glimversal_motion":
-                        if game_state.purchase_skill('glimversal_motion', grid.center_tile_pos):
-                            ui.show_notification("Glimversal Motion unlocked!")
-                    elif action == "purchase_glimdraulic_drills":
-                        if game_state.purchase_skill('glimdraulic_drills', grid.center_tile_pos):
-                            ui.show_notification("Glimdraulic Drills unlocked!")
+                        if action == "toggle_destroy_mode": pass # Handled by UI
+                        elif action == "purchase_glim": sim.apply_input('purchase_glim')
+                        elif action == "build_wellspring":
+                            if game_state.can_purchase("wellspring"):
+                                game_state.build_mode_item = "wellspring"
+                                build_preview_surface = Wellspring.get_preview_surface()
+                                ui.build_menu_open = False
+                        elif action == "build_beacon":
+                            if game_state.can_purchase("beacon"):
+                                game_state.build_mode_item = "beacon"
+                                build_preview_surface = Beacon.get_preview_surface()
+                                ui.build_menu_open = False
+                        elif action == "build_stomper_post":
+                            if game_state.can_purchase("stompertrainingpost"):
+                                game_state.build_mode_item = "stomper_post"
+                                build_preview_surface = StomperTrainingPost.get_preview_surface()
+                                ui.build_menu_open = False
+                        elif action == "purchase_glimversal_motion":
+                            show_effects(ui, sim.apply_input('purchase_skill', 'glimversal_motion'))
+                        elif action == "purchase_glimdraulic_drills":
+                            show_effects(ui, sim.apply_input('purchase_skill', 'glimdraulic_drills'))
                     
-                    elif action is None: # World click
-                        if game_state.build_mode_item:
-                            tile_to_build_on = grid.get_tile_at_world_pos(world_x, world_y)
-                            if tile_to_build_on and tile_to_build_on.is_buildable():
-                                structure_map = {"wellspring": Wellspring, "beacon": Beacon, "stomper_post": StomperTrainingPost}
-                                structure_class = structure_map.get(game_state.build_mode_item)
-                                if structure_class: game_state.place_structure(structure_class, tile_to_build_on)
-                        else:
-                            clicked_structure = grid.get_structure_at_world_pos(world_x, world_y, game_state.structures)
-                            if clicked_structure and isinstance(clicked_structure, StomperTrainingPost):
-                                status = clicked_structure.toggle_pause()
-                                ui.show_notification(f"Training {status}")
+                        elif action is None: # World click
+                            if game_state.build_mode_item:
+                                show_effects(ui, sim.apply_input('build', game_state.build_mode_item, world_x, world_y))
+                                pygame.mouse.set_visible(True)
                             else:
-                                result = grid.handle_click(world_x, world_y, PLAYER_CLICK_STRENGTH)
-                                if result == "core_cultivated":
-                                    if not game_state.skill_tree_unlocked:
-                                        game_state.skill_tree_unlocked = True
-                                        game_state.skill_points += 1
-                                        ui.show_notification("Core Stabilized! Skill Tree Unlocked!")
-                                    game_state.add_essence(1000)
-                                elif isinstance(result, (int, float)) and result > 0:
-                                     game_state.add_essence(result)
+                                show_effects(ui, sim.apply_input('click', world_x, world_y))
 
-                elif event.button == 3: # Right click to cancel modes
-                    if game_state.build_mode_item or game_state.destroy_mode:
-                        game_state.build_mode_item = None
-                        game_state.destroy_mode = False
+                    elif event.button == 3: # Right click to cancel modes
+                        if game_state.build_mode_item or game_state.destroy_mode:
+                            game_state.build_mode_item = None
+                            game_state.destroy_mode = False
 
-        camera.handle_input(events)
-        camera.update_keys(delta_time)
+            camera.handle_input(events)
+            camera.update_keys(delta_time)
+            sim.set_view(*camera.visible_range())
+            camera.set_bounds(*grid.pixel_bounds())
         
         # Update Logic
-        passive_essence, grid_effects = grid.update(delta_time)
-        if passive_essence > 0: game_state.add_essence(passive_essence)
-        for effect in grid_effects:
-            if effect.get('type') == 'notification':
-                ui.show_notification(effect['text'])
-                if effect['text'] == 'Mountain Cleared!':
-                    game_state.skill_points += 1
-                    ui.show_notification("Skill Point Gained!")
-            else:
-                ui.add_floating_text(effect.get('x', 0), effect.get('y', 0), effect.get('text', ''))
-
-        for struct in game_state.structures:
-            essence, effect = struct.update(delta_time, game_state)
-            if essence > 0: game_state.add_essence(essence)
-            if effect and effect.get('type') == 'notification':
-                ui.show_notification(effect['text'])
-            elif effect:
-                ui.add_floating_text(effect.get('x',0), effect.get('y',0), effect.get('text',''))
-        
-        for glim in game_state.glims:
-            target = grid.find_next_target(glim, game_state.glim_targeting)
-            buff = grid.get_buff_at_tile(glim, game_state.structures)
-            essence, effect = glim.update(delta_time, target, buff)
-            if essence == "core_cultivated":
-                if not game_state.skill_tree_unlocked:
-                    game_state.skill_tree_unlocked = True
-                    game_state.skill_points += 1
-                    ui.show_notification("Core Stabilized! Skill Tree Unlocked!")
-                game_state.add_essence(1000)
-            elif isinstance(essence, (int, float)) and essence > 0:
-                game_state.add_essence(essence)
-            if effect:
-                if effect.get('type') == 'notification':
-                    ui.show_notification(effect['text'])
-                    if effect['text'] == 'Mountain Cleared!':
-                        game_state.skill_points += 1
-                        ui.show_notification("Skill Point Gained!")
-                else:
-                    ui.add_floating_text(effect.get('x',0), effect.get('y',0), effect.get('text',''))
-
-        ui.update(delta_time)
+        show_effects(ui, sim.advance(delta_time))
+        with profiler.scope('ui_update'):
+            ui.update(delta_time)
+        with profiler.scope('autosave'):
+            autosaver.update(sim, delta_time)
+            error = autosaver.take_error()
+            if error:
+                ui.show_notification(f"Autosave failed: {error}")
         
         # Draw Logic
-        screen.fill(SKY_COLOR)
-        grid.draw(screen, camera.offset_x)
+        view_left, view_right = camera.visible_range()
+        with profiler.scope('draw_grid'):
+            screen.fill(SKY_COLOR)
+            culled_tiles = grid.draw(screen, camera.offset_x)
+            dirty.extend(grid.redrawn_rects)
 
-        for struct in game_state.structures:
-            struct.draw(screen, camera.offset_x)
+        with profiler.scope('draw_structures'):
+            # Beacon range circles reach past their tile, so widen the query by that much
+            visible_structures = grid.structures_in_range(view_left - BEACON_RANGE, view_right + BEACON_RANGE)
+            for struct in visible_structures:
+                dirty.add(struct.draw(screen, camera.offset_x))
 
-        for glim in game_state.glims:
-            glim.draw(screen, camera.offset_x)
+        with profiler.scope('draw_glims'):
+            culled_glims = game_state.glims.draw(screen, camera.offset_x)
+            dirty.extend(game_state.glims.drawn_rects)
 
         # Draw build/destroy previews
         if game_state.destroy_mode:
-            structure_under_mouse = grid.get_structure_at_world_pos(world_x, world_y, game_state.structures)
+            structure_under_mouse = grid.get_structure_at_world_pos(world_x, world_y)
             if structure_under_mouse:
                 overlay = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
                 overlay.fill(DESTROY_VALID_COLOR)
                 on_screen_rect = structure_under_mouse.tile.rect.copy()
                 on_screen_rect.x -= camera.offset_x
-                screen.blit(overlay, on_screen_rect)
+                dirty.add(screen.blit(overlay, on_screen_rect))
         elif game_state.build_mode_item:
             tile_under_mouse = grid.get_tile_at_world_pos(world_x, world_y)
             if tile_under_mouse:
@@ -188,14 +193,46 @@ def main():
                 overlay.fill(color)
                 on_screen_rect = tile_under_mouse.rect.copy()
                 on_screen_rect.x -= camera.offset_x
-                screen.blit(overlay, on_screen_rect)
+                dirty.add(screen.blit(overlay, on_screen_rect))
             
             if build_preview_surface:
-                screen.blit(build_preview_surface, build_preview_surface.get_rect(center=mouse_pos))
+                dirty.add(screen.blit(build_preview_surface, build_preview_surface.get_rect(center=mouse_pos)))
+
+        with profiler.scope('draw_ui'):
+            culled_texts = ui.draw(screen, camera.offset_x)
+            dirty.extend(ui.drawn_rects)
+        with profiler.scope('flip'):
+            # Only the areas drawn over are pushed while the camera holds still; any camera motion flips
+            dirty_rects = dirty.present(camera.offset_x)
 
-        ui.draw(screen, camera.offset_x)
-        pygame.display.flip()
+        profiler.set_count('glims', len(game_state.glims))
+        profiler.set_count('structures', len(game_state.structures))
+        chunks_loaded, chunks_compressed = grid.chunk_counts()
+        profiler.set_count('chunks_loaded', chunks_loaded)
+        profiler.set_count('chunks_compressed', chunks_compressed)
+        profiler.set_count('events_fired', sim.scheduler.fired)
+        profiler.set_count('events_pending', len(sim.scheduler))
+        profiler.set_count('glim_sprites_saved', game_state.glims.sprites_saved)
+        profiler.set_count('floating_texts', len(ui.floating_texts))
+        profiler.set_count('effects_coalesced', ui.effects.coalesced)
+        profiler.set_count('effects_dropped', ui.effects.dropped)
+        profiler.set_count('text_cache_hits', text_cache.hits)
+        profiler.set_count('text_cache_misses', text_cache.misses)
+        profiler.set_count('dirty_rects', dirty_rects)
+        profiler.set_count('full_updates', dirty.full_updates)
+        if profiler.enabled:
+            atlas_report = atlas.report()
+            profiler.set_count('atlas_sprites', atlas_report['sprites'])
+            profiler.set_count('atlas_kb', atlas_report['bytes'] // 1024)
+        profiler.set_count('culled', culled_tiles + len(game_state.structures) - len(visible_structures)
+                           + culled_glims + culled_texts)
+        profiler.end_frame()
     
+    if sim.recorder:
+        sim.recorder.finish()
+    autosaver.wait()
+    savegame.save(sim, SAVE_PATH)
+    sim.close()
     pygame.quit()
 
 if __name__ == '__main__':
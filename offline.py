@@ -0,0 +1,380 @@
+import math
+import numpy as np
+from settings import (TILE_SIZE, GLIM_SPEED, GLIM_CULTIVATION_RATE, GLIM_CULTIVATION_STRENGTH,
+                      GLIM_MINING_STRENGTH, STOMPER_LUNGE_DISTANCE, STOMPER_LUNGE_SPEED_MULTIPLIER,
+                      STOMPER_LUNGE_COOLDOWN, STOMPER_TARGET_SPREAD, STOMPER_CONVERSION_COST, OFFLINE_MAX_SEGMENT)
+from swarm import (TYPE_STANDARD, TYPE_STOMPER, STATE_IDLE, NO_TARGET, _balance_stompers, _hits_needed, _spread_counts,
+                   _spread_standard, _group_by_target)
+from structure import StomperTrainingPost
+
+# Distance a stomper covers each way between its lunge origin and the mountain's center
+_LUNGE_REACH = TILE_SIZE // 2 + STOMPER_LUNGE_DISTANCE
+
+def stomper_lunge_time(buff):
+    return _LUNGE_REACH / (GLIM_SPEED * buff * STOMPER_LUNGE_SPEED_MULTIPLIER)
+
+def stomper_cycle_time(buff):
+    # One lunge in, then walk back; the cooldown runs while walking
+    return stomper_lunge_time(buff) + max(_LUNGE_REACH / (GLIM_SPEED * buff), STOMPER_LUNGE_COOLDOWN)
+
+class _Crew:
+    # A group of Glims working one tile: hits land at a steady rate once the walk there is over
+    def __init__(self, tile, travel):
+        self.tile = tile
+        self.travel = travel
+        self.hits = 0.0
+        self.size = 0
+        self.rate = 0.0
+        self.buff = 1.0
+        self.overflow = False
+
+    def time_to_clear(self, rate, strength):
+        if rate <= 0:
+            return math.inf
+        needed = math.ceil(self.tile.current_toughness / strength) - self.hits
+        return self.travel + max(needed, 0) / rate
+
+    def work(self, seconds, rate):
+        worked = max(seconds - self.travel, 0.0)
+        self.travel = max(self.travel - seconds, 0.0)
+        self.hits += worked * rate
+
+class _Cultivators:
+    # Standard Glims working one barren tile. Each walks there first and then adds a hit every
+    # GLIM_CULTIVATION_RATE seconds, so hits build up piecewise linearly as members arrive
+    def __init__(self, tile, walks, hits=0.0):
+        self.tile = tile
+        self.walks = np.sort(walks)
+        self._walked = np.cumsum(self.walks)
+        # Glim-seconds worked by the time each member arrives
+        self._worked_at = np.arange(1, len(self.walks) + 1) * self.walks - self._walked
+        self.elapsed = 0.0
+        self.hits = hits
+        self._clear = None # When and at how many hits time_to_clear last said the tile falls
+
+    def _worked(self, t):
+        arrived = int(np.searchsorted(self.walks, t, side='right'))
+        return arrived * t - (self._walked[arrived - 1] if arrived else 0.0)
+
+    def time_to_clear(self, strength):
+        total = math.ceil(self.tile.current_toughness / strength)
+        needed = total - self.hits
+        if needed <= 0:
+            return 0.0
+        goal = self._worked(self.elapsed) + needed * GLIM_CULTIVATION_RATE
+        # The goal is reached while the first `arrived` members are working
+        arrived = int(np.searchsorted(self._worked_at, goal))
+        clear_at = (goal + self._walked[arrived - 1]) / arrived
+        self._clear = clear_at, total
+        return clear_at - self.elapsed
+
+    def work(self, seconds):
+        self.hits += (self._worked(self.elapsed + seconds) - self._worked(self.elapsed)) / GLIM_CULTIVATION_RATE
+        self.elapsed += seconds
+        # Glim-seconds run large, so rounding can leave the last hit a hair short of landing when it is due
+        if self._clear and self.elapsed >= self._clear[0]:
+            self.hits = max(self.hits, self._clear[1])
+
+class OfflineProgress:
+    def __init__(self, sim):
+        self.sim = sim
+        self.game_state = sim.game_state
+        self.grid = sim.grid
+        self.essence = 0
+        self.tiles_cultivated = 0
+        self.mountains_cleared = 0
+        self.segments = 0
+        self.notifications = []
+        self._clock = 0.0
+        self._cultivators = {}
+        # Standard Glims by swarm index, with the walk each is on: from where, to where, and when
+        self._standards = None
+        self._walk_from = self._walk_to = self._departed = self._arrives = None
+        self._spread_key = None
+        self._mines = {}
+        self._overfull = set() # Crews whose mountain now needs fewer hits than they have members
+        self._stompers = None # Swarm indices of the stompers, and the mountain each one is working
+        self._stomper_targets = None
+
+    def _travel_time(self, from_x, tile):
+        return float(self._travel_times(np.float64(from_x), np.float64(tile.rect.centerx)))
+
+    def _travel_times(self, from_xs, to_xs):
+        # Beacons speed up only the stretch of a walk that passes through their range
+        return self.game_state.beacon_index.walk_lengths(from_xs, to_xs) / GLIM_SPEED
+
+    def _stomper_crews(self):
+        # Stompers follow the same balancing as the swarm, but only those whose mountain is gone or full (or
+        # who are new) are seated again; everyone else stays in their crew. Each group is one crew
+        swarm = self.game_state.glims
+        mountains = self.grid.mountain_array()
+        stompers = np.flatnonzero(swarm.glim_type == TYPE_STOMPER)
+        if not len(mountains) or not len(stompers):
+            self._mines = {}
+            self._overfull.clear()
+            return self._mines
+        first = self._stompers is None
+        targets = swarm.target[stompers]
+        held = np.minimum(np.searchsorted(mountains, targets), len(mountains) - 1)
+        # The first time round every stomper is seated afresh, as the swarm would
+        holding = (mountains[held] == targets) & (not first)
+        # As in the swarm, a mountain keeps no more stompers than it still needs hits, lowest indices first
+        for tile_index in self._overfull:
+            room = math.ceil(self._mines[tile_index].tile.current_toughness / GLIM_MINING_STRENGTH)
+            holding[np.flatnonzero(holding & (targets == tile_index))[room:]] = False
+        self._overfull.clear()
+        free = np.flatnonzero(~holding)
+        if len(free) == 0 and len(stompers) == len(self._stompers):
+            return self._mines
+        left = set(targets[free].tolist())
+        if len(free):
+            targets[free] = self._seat_stompers(swarm.x[stompers[free]], targets[free], mountains, held[holding])
+            # Kept on the swarm too, so crews hold together when stepping resumes
+            swarm.target[stompers[free]] = targets[free]
+        self._stompers, self._stomper_targets = stompers, targets
+
+        # Only crews that stompers left or joined change
+        joined = set(targets[free].tolist())
+        tile_indices, sizes = np.unique(targets, return_counts=True)
+        sizes = dict(zip(tile_indices.tolist(), sizes.tolist()))
+        mines = self._mines
+        for tile_index in set(sizes) if first else (left | joined) - {NO_TARGET}:
+            size = sizes.get(tile_index, 0)
+            crew = mines.get(tile_index)
+            if size == 0:
+                mines.pop(tile_index, None)
+                continue
+            if crew is None:
+                # Newcomers walk from wherever the group stands on average and lunge together: their first
+                # volley lands as they arrive, later ones once per cycle. Clearing sends them straight on,
+                # so a crew big enough to clear in one volley never walks back
+                tile = self.grid.tiles[tile_index]
+                buff = self.game_state.beacon_index.buff_at(tile.rect.centerx)
+                start_x = float(swarm.x[self._crew_members(tile_index)].mean())
+                crew = mines[tile_index] = _Crew(tile, self._travel_time(start_x, tile) + stomper_lunge_time(buff))
+                crew.buff = buff
+                crew.hits = size
+            elif tile_index in joined and crew.travel == 0:
+                # Stompers joining a crew at work walk to it and go with the next volley
+                swarm.x[self._crew_members(tile_index)] = crew.tile.rect.centerx
+            crew.size = size
+            crew.rate = size / stomper_cycle_time(crew.buff)
+            # A crew seated over what its mountain needs is the overflow of a crowd with nowhere else in
+            # reach; it would only be seated right back, so it is not checked for room again
+            crew.overflow = size > math.ceil(crew.tile.current_toughness / GLIM_MINING_STRENGTH)
+        return mines
+
+    def _crew_members(self, tile_index):
+        return self._stompers[self._stomper_targets == tile_index]
+
+    def _seat_stompers(self, xs, current, mountains, held):
+        # Only mountains within reach of the stompers being seated are looked at; their room is what the
+        # mountain still needs less the stompers already working it
+        centers = mountains * TILE_SIZE + TILE_SIZE // 2
+        lo = max(int(np.searchsorted(centers, xs.min())) - STOMPER_TARGET_SPREAD, 0)
+        hi = min(int(np.searchsorted(centers, xs.max())) + STOMPER_TARGET_SPREAD + 1, len(mountains))
+        nearby = mountains[lo:hi]
+        room = _hits_needed(self.grid, nearby, GLIM_MINING_STRENGTH) - np.bincount(held, minlength=len(mountains))[lo:hi]
+        return _balance_stompers(xs, current, nearby, np.maximum(room, 0), STOMPER_TARGET_SPREAD)
+
+    def _refresh_frontier(self):
+        # Standard Glims are spread over the frontier as the swarm does it, whenever the swarm would: when the
+        # frontier or the mountains change, or Glims leave for training. Pairing them off again is only
+        # needed once that changes how many each tile gets
+        swarm, grid = self.game_state.glims, self.grid
+        frontier, mountains = grid.frontier_array(self.game_state.glim_targeting), grid.mountain_array()
+        standards = swarm.count_of('standard')
+        key = self._spread_key
+        if key and key[0] is frontier and key[1] is mountains and key[2] == standards:
+            return self._cultivators
+        need = _hits_needed(grid, frontier, GLIM_CULTIVATION_STRENGTH)
+        counts = _spread_counts(standards, need) if len(frontier) and standards else None
+        self._spread_key = frontier, mountains, standards, counts
+        if (key and counts is not None and key[3] is not None and np.array_equal(frontier, key[0])
+                and np.array_equal(counts, key[3])):
+            return self._cultivators
+        self._spread_standard(frontier, need)
+        return self._cultivators
+
+    def _spread_standard(self, frontier, need):
+        swarm = self.game_state.glims
+        standards = np.flatnonzero(swarm.glim_type == TYPE_STANDARD)
+        if self._standards is None:
+            # Everyone starts out standing where the swarm left them
+            xs = swarm.x[standards].copy()
+            self._walk_from, self._walk_to = xs, xs.copy()
+            self._departed = self._arrives = np.full(len(standards), self._clock)
+        elif len(standards) != len(self._standards):
+            # Glims taken for training leave; the rest carry on with their walks
+            kept = np.searchsorted(self._standards, standards)
+            self._walk_from, self._walk_to = self._walk_from[kept], self._walk_to[kept]
+            self._departed, self._arrives = self._departed[kept], self._arrives[kept]
+        self._standards = standards
+
+        xs = self._positions()
+        # Kept on the swarm too, so a Glim picked for training starts from where it stands
+        swarm.x[standards] = xs
+        if not len(frontier) or not len(standards):
+            swarm.target[standards] = NO_TARGET
+            self._walk_from, self._walk_to = xs, xs.copy()
+            self._departed = self._arrives = np.full(len(standards), self._clock)
+            self._cultivators = {}
+            return
+        targets = _spread_standard(xs, frontier, need)
+        to_xs = targets * TILE_SIZE + TILE_SIZE // 2
+        moved = (targets != swarm.target[standards]) | (to_xs != self._walk_to)
+        swarm.target[standards] = targets
+        self._walk_from[moved], self._walk_to[moved] = xs[moved], to_xs[moved]
+        self._departed = np.where(moved, self._clock, self._departed)
+        self._arrives = np.where(moved, self._clock + self._travel_times(xs, to_xs), self._arrives)
+
+        # Leftover wind-up stays with a tile that keeps its crew
+        cultivators = {}
+        for tile_index, members in _group_by_target(np.arange(len(standards)), targets):
+            previous = self._cultivators.get(tile_index)
+            cultivators[tile_index] = _Cultivators(self.grid.tiles[tile_index], np.maximum(self._arrives[members] - self._clock, 0.0),
+                                                   previous.hits if previous else 0.0)
+        self._cultivators = cultivators
+
+    def _positions(self):
+        # Where each standard Glim is now, part way along its walk if it hasn't arrived
+        walked = (self._clock - self._departed) * GLIM_SPEED
+        return self.game_state.beacon_index.walked_to(self._walk_from, self._walk_to, walked)
+
+    def run(self, seconds):
+        game_state = self.game_state
+        swarm = game_state.glims
+        # Tile income is integrated per segment, so its per-tile events are parked for the whole run
+        self.grid.suspend_passive_events()
+        remaining = seconds
+        while remaining > 1e-9:
+            # Cleared mountains move the frontier outward, so chunks past it are generated as it goes
+            self.grid.maintain_chunks()
+            cultivators = self._refresh_frontier()
+            crews = self._stomper_crews()
+
+            # The segment ends at the next state change, or earlier so income-gated purchases are rechecked
+            segment = min(remaining, OFFLINE_MAX_SEGMENT)
+            for cultivator in cultivators.values():
+                segment = min(segment, cultivator.time_to_clear(GLIM_CULTIVATION_STRENGTH))
+            for crew in crews.values():
+                segment = min(segment, crew.time_to_clear(crew.rate, GLIM_MINING_STRENGTH))
+            for struct in game_state.structures:
+                if isinstance(struct, StomperTrainingPost) and struct.is_training and not struct.is_paused:
+                    segment = min(segment, max(struct.training_timer, 0.0))
+            segment = max(segment, 0.0)
+
+            self._advance(segment, cultivators, crews)
+            remaining -= segment
+            self.segments += 1
+
+        # Deferred tile income is worked out once for the whole run
+        earned = self.grid.collect_passive()
+        self.game_state.add_essence(earned)
+        self.essence += earned
+        self.grid.resume_passive_events()
+        self._settle_glims()
+        return self.report()
+
+    def _advance(self, seconds, cultivators, crews):
+        game_state = self.game_state
+        # Tile income is only worked out when a post is waiting for essence; otherwise it waits for the end
+        self.grid.defer_passive(seconds)
+        earned = self.grid.collect_passive() if self._waiting_for_income() else 0
+        for struct in list(game_state.structures):
+            earned += struct.fast_forward(seconds)
+
+        effects = []
+        for cultivator in cultivators.values():
+            cultivator.work(seconds)
+            earned += self._land_cultivation(cultivator, effects)
+        for tile_index, crew in list(crews.items()):
+            travelling = crew.travel > 0
+            crew.work(seconds, crew.rate)
+            if travelling and crew.travel == 0:
+                # Arrived crews stand at their mountain, so members sent elsewhere next walk from there
+                self.game_state.glims.x[self._crew_members(tile_index)] = crew.tile.rect.centerx
+            self._land_mining(tile_index, crew, effects)
+
+        game_state.add_essence(earned)
+        self.essence += earned
+        before = game_state.life_essence
+        # Timers were advanced above, so the clock skips ahead; anything due right now (a finished
+        # training, an idle post's recheck) then fires as usual
+        scheduler = self.sim.scheduler
+        scheduler.skip(seconds)
+        effects.extend(self.sim._collect(scheduler.advance(0.0)))
+        self.notifications.extend(e['text'] for e in self.sim._apply_rules(effects) if e.get('type') == 'notification')
+        self.essence += game_state.life_essence - before
+        self.sim.time += seconds
+        self._clock += seconds
+
+    def _waiting_for_income(self):
+        game_state = self.game_state
+        return game_state.life_essence < STOMPER_CONVERSION_COST and any(
+            isinstance(struct, StomperTrainingPost) and not struct.is_training and not struct.is_paused
+            and struct.trained_count < struct.capacity for struct in game_state.structures)
+
+    def _land_cultivation(self, crew, effects):
+        tile = crew.tile
+        hits = min(int(crew.hits + 1e-9), math.ceil(tile.current_toughness / GLIM_CULTIVATION_STRENGTH))
+        if hits <= 0:
+            return 0
+        crew.hits -= hits
+        result = tile.take_damage(GLIM_CULTIVATION_STRENGTH * hits)
+        earned = result
+        if result == "core_cultivated":
+            earned = GLIM_CULTIVATION_STRENGTH * (hits - 1)
+            effects.append({'type': 'core_cultivated'})
+        if tile.state == 'living':
+            self.tiles_cultivated += 1
+        return earned
+
+    def _land_mining(self, tile_index, crew, effects):
+        tile = crew.tile
+        hits = min(int(crew.hits + 1e-9), math.ceil(tile.current_toughness / GLIM_MINING_STRENGTH))
+        if hits <= 0 or crew.travel > 0:
+            return
+        crew.hits -= hits
+        if tile.take_damage(GLIM_MINING_STRENGTH * hits) == "mountain_cleared":
+            self.mountains_cleared += 1
+            effects.append({'type': 'notification', 'text': 'Mountain Cleared!'})
+            del self._mines[tile_index]
+            self._overfull.discard(tile_index)
+            # The crew regroups on the cleared tile and walks to its next mountain from there
+            self.game_state.glims.x[self._crew_members(tile_index)] = tile.rect.centerx
+        elif not crew.overflow and crew.size > math.ceil(tile.current_toughness / GLIM_MINING_STRENGTH):
+            self._overfull.add(tile_index)
+
+    def _settle_glims(self):
+        # Park every Glim at its final target so the live simulation picks up from a sensible spot
+        swarm, grid = self.game_state.glims, self.grid
+        swarm.state[:] = STATE_IDLE
+        swarm.action_timer[:] = 0
+        swarm.target[:] = NO_TARGET
+        targets = swarm._find_targets(grid, self.game_state.glim_targeting)
+        # Glims keep these when stepping resumes, so nobody switches mountains on the first tick
+        swarm.target[:] = targets
+        swarm.retarget()
+        has_target = targets != NO_TARGET
+        is_stomper = swarm.glim_type == TYPE_STOMPER
+        centerx = targets * TILE_SIZE + TILE_SIZE // 2
+        standard = has_target & ~is_stomper
+        swarm.x[standard] = centerx[standard]
+        swarm.y[standard] = grid.ground_y - 8
+        stompers = has_target & is_stomper
+        side = np.where(swarm.x[stompers] < centerx[stompers], -1, 1)
+        swarm.x[stompers] = centerx[stompers] + side * _LUNGE_REACH
+        swarm.y[stompers] = grid.ground_y + TILE_SIZE // 2
+
+    def report(self):
+        return {
+            'essence': self.essence,
+            'tiles_cultivated': self.tiles_cultivated,
+            'mountains_cleared': self.mountains_cleared,
+            'segments': self.segments,
+            'notifications': self.notifications,
+        }
+
+def fast_forward(sim, seconds):
+    return OfflineProgress(sim).run(seconds)
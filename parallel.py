@@ -0,0 +1,118 @@
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+from settings import SIM_SHARD_MIN_GLIMS
+from swarm import GlimSwarm, SWARM_COLUMNS
+
+_ALIGN = 64
+_COLUMN_DTYPES = {attr: getattr(GlimSwarm(capacity=0), attr).dtype for attr in SWARM_COLUMNS.values()}
+_COLUMN_DTYPES['_buff'] = np.dtype(np.float64) # Speed buffs for this tick, written before the workers run
+
+def _aligned(offset):
+    return -(-offset // _ALIGN) * _ALIGN
+
+def _block_size(capacity):
+    return max(sum(_aligned(capacity * dtype.itemsize) for dtype in _COLUMN_DTYPES.values()), 1)
+
+def _column_views(buffer, capacity):
+    views = {}
+    offset = 0
+    for attr, dtype in _COLUMN_DTYPES.items():
+        views[attr] = np.ndarray(capacity, dtype=dtype, buffer=buffer, offset=offset)
+        offset += _aligned(capacity * dtype.itemsize)
+    return views
+
+class SharedGlimSwarm(GlimSwarm):
+    # Columns live in one shared memory block. Each tick the swarm is cut into contiguous ranges that
+    # worker processes step in place; only the Glims whose hits land come back to be applied here
+    def __init__(self, workers, capacity=1024, min_shard=SIM_SHARD_MIN_GLIMS, rng=None):
+        self.workers = workers
+        self.min_shard = min_shard
+        self._block = None
+        self._pool = None
+        self._buff = None
+        super().__init__(capacity, rng)
+
+    def _grow(self, capacity):
+        super()._grow(capacity)
+        self._share()
+
+    def load_columns(self, columns):
+        super().load_columns(columns)
+        self._share()
+
+    def _share(self):
+        # Copies every column into a fresh block; workers map it the first time they see its name
+        if self.workers <= 1:
+            return
+        block = shared_memory.SharedMemory(create=True, size=_block_size(self._capacity))
+        views = _column_views(block.buf, self._capacity)
+        self._buff = views.pop('_buff')
+        for attr, view in views.items():
+            view[:] = getattr(self, attr)
+            setattr(self, attr, view)
+        self._release()
+        self._block = block
+
+    def _release(self):
+        if self._block is not None:
+            self._block.unlink()
+            self._block.close()
+            self._block = None
+
+    def _shards(self):
+        shards = min(self.workers, self.count // max(self.min_shard, 1))
+        if shards < 2:
+            return [(0, self.count)]
+        return [(self.count * i // shards, self.count * (i + 1) // shards) for i in range(shards)]
+
+    def _step(self, delta_time, mountains, ground_y, beacon_index):
+        shards = self._shards()
+        if len(shards) < 2:
+            return super()._step(delta_time, mountains, ground_y, beacon_index)
+
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.workers - 1)
+        # Buffs are looked up once here, so workers read them from the block instead of each being sent the index
+        self._buff[:self.count] = beacon_index.buffs_at(self.x)
+        inputs = (delta_time, mountains, ground_y)
+        pending = self._pool.map_async(_step_shard, [(self._block.name, self._capacity, lo, hi) + inputs
+                                                     for lo, hi in shards[1:]])
+        # The first range is stepped here while the workers run the rest
+        lo, hi = shards[0]
+        results = [self.step_range(lo, hi, *inputs, self._buff[lo:hi])] + pending.get()
+        # Ranges are in Glim order, so the joined hits match what one pass over the swarm would find
+        return tuple(np.concatenate(parts) for parts in zip(*results))
+
+    def close(self):
+        # Back to private arrays and in-process stepping; safe to call more than once
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        self.workers = 0
+        if self._block is not None:
+            for attr in SWARM_COLUMNS.values():
+                setattr(self, attr, getattr(self, attr).copy())
+            self._buff = None
+            self._release()
+
+# Per worker process: the block it has mapped, a swarm whose columns view it, and the block's buff column
+_worker_block = None
+_worker_swarm = None
+_worker_buff = None
+
+def _step_shard(task):
+    global _worker_block, _worker_swarm, _worker_buff
+    name, capacity, lo, hi, *inputs = task
+    if _worker_block is None or _worker_block.name != name:
+        _worker_swarm = _worker_buff = None # Views must go before the old block can be closed
+        if _worker_block is not None:
+            _worker_block.close()
+        _worker_block = shared_memory.SharedMemory(name=name)
+        _worker_swarm = GlimSwarm(capacity=0)
+        views = _column_views(_worker_block.buf, capacity)
+        _worker_buff = views.pop('_buff')
+        for attr, view in views.items():
+            setattr(_worker_swarm, attr, view)
+    return _worker_swarm.step_range(lo, hi, *inputs, _worker_buff[lo:hi])
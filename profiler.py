@@ -0,0 +1,98 @@
+import csv
+import json
+import sys
+import time
+from collections import deque
+from contextlib import nullcontext
+from settings import PROFILE_WINDOW_FRAMES, PROFILE_TRACE_FRAMES
+
+_NULL_SCOPE = nullcontext()
+
+class _Scope:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+class FrameProfiler:
+    def __init__(self, window=PROFILE_WINDOW_FRAMES, trace_frames=PROFILE_TRACE_FRAMES, enabled=False):
+        self.enabled = enabled
+        self.window = window
+        self.phases = {}
+        self.counts = {}
+        self.trace = deque(maxlen=trace_frames)
+        self._frame = {}
+        self._frame_start = None
+        self._blocks_at_start = 0
+        self._frame_index = 0
+
+    def scope(self, name):
+        if not self.enabled:
+            return _NULL_SCOPE
+        return _Scope(self, name)
+
+    def add_time(self, name, seconds):
+        self._frame[name] = self._frame.get(name, 0.0) + seconds
+
+    def set_count(self, name, value):
+        if self.enabled:
+            self.counts[name] = value
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self._frame = {}
+        self._blocks_at_start = sys.getallocatedblocks()
+        self._frame_start = time.perf_counter()
+
+    def end_frame(self):
+        if not self.enabled or self._frame_start is None:
+            return
+        self._frame['frame'] = time.perf_counter() - self._frame_start
+        # Net allocated blocks over the frame, a cheap stand-in for the allocation rate
+        self.counts['alloc_blocks'] = sys.getallocatedblocks() - self._blocks_at_start
+        for name, seconds in self._frame.items():
+            samples = self.phases.get(name)
+            if samples is None:
+                samples = self.phases[name] = deque(maxlen=self.window)
+            samples.append(seconds)
+        record = {'frame': self._frame_index}
+        record.update({f"{name}_ms": round(seconds * 1000, 4) for name, seconds in self._frame.items()})
+        record.update(self.counts)
+        self.trace.append(record)
+        self._frame_index += 1
+        self._frame_start = None
+
+    def percentiles(self, name):
+        samples = sorted(self.phases.get(name, ()))
+        if not samples:
+            return 0.0, 0.0
+        p50 = samples[len(samples) // 2]
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        return p50 * 1000, p99 * 1000
+
+    def summary(self):
+        return {name: dict(zip(('p50_ms', 'p99_ms'), self.percentiles(name))) for name in self.phases}
+
+    def export(self, path):
+        if path.endswith('.csv'):
+            columns = []
+            for record in self.trace:
+                columns.extend(key for key in record if key not in columns)
+            with open(path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(self.trace)
+        else:
+            with open(path, 'w') as f:
+                json.dump({'summary': self.summary(), 'counts': self.counts, 'frames': list(self.trace)}, f, indent=2)
+        return path
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+import savegame
+from settings import REPLAY_PATH
+
+REPLAY_VERSION = 1
+
+def state_digest(sim):
+    # Hashes every saved column plus the summary, so two runs either match exactly or they don't
+    columns = savegame.snapshot(sim)[1]
+    digest = hashlib.sha256(json.dumps(sim.summary(), sort_keys=True).encode())
+    for name, column in sorted(columns.items()):
+        digest.update(name.encode())
+        digest.update(column.tobytes())
+    return digest.hexdigest()
+
+class ReplayRecorder:
+    # Logs player inputs with the simulation frame they were applied before. The game is saved and
+    # loaded straight back when recording starts, so the live run and every playback begin from the same bytes
+    def __init__(self, sim, path=REPLAY_PATH):
+        self.sim = sim
+        self.path = path
+        self.snapshot_path = f"{path}.glim"
+        savegame.save(sim, self.snapshot_path)
+        savegame.load(sim, self.snapshot_path, mapped=False) # The next recording overwrites this file
+        self.start_frame = sim.frame
+        self.rng_state = sim.rng.getstate()
+        self.inputs = []
+        if sim.view is not None:
+            self.record('view', *sim.view)
+
+    def record(self, action, *args):
+        self.inputs.append([self.sim.frame - self.start_frame, action, *args])
+
+    def finish(self):
+        sim = self.sim
+        data = {
+            'version': REPLAY_VERSION,
+            'snapshot': os.path.basename(self.snapshot_path),
+            'screen_height': sim.screen_height,
+            'timestep': sim.timestep,
+            'rng_state': self.rng_state,
+            'frames': sim.frame - self.start_frame,
+            'inputs': self.inputs,
+            'summary': sim.summary(),
+            'digest': state_digest(sim),
+        }
+        with open(self.path, 'w') as f:
+            json.dump(data, f)
+        return self.path
+
+def read(path):
+    with open(path) as f:
+        data = json.load(f)
+    if data.get('version') != REPLAY_VERSION:
+        raise ValueError(f"Unsupported replay version {data.get('version')} (expected {REPLAY_VERSION})")
+    data['snapshot'] = os.path.join(os.path.dirname(path), data['snapshot'])
+    return data
+
+def play(sim, data):
+    # Steps as fast as possible, applying each input before the frame it was recorded at.
+    # Returns whether the final state matches the recording
+    savegame.load(sim, data['snapshot'])
+    version, state, gauss = data['rng_state']
+    sim.rng.setstate((version, tuple(state), gauss))
+    start_frame = sim.frame
+    for frame, action, *args in data['inputs'] + [[data['frames'], None]]:
+        for _ in range(frame - (sim.frame - start_frame)):
+            sim.step()
+        if action == 'view':
+            sim.set_view(*args)
+        elif action is not None:
+            sim.apply_input(action, *args)
+    return state_digest(sim) == data['digest']
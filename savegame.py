@@ -0,0 +1,244 @@
+import json
+import os
+import struct
+import threading
+import time
+import numpy as np
+from settings import SAVE_PATH, AUTOSAVE_INTERVAL, AUTOSAVE_ROWS_PER_FRAME, TILE_SIZE
+from structure import Wellspring, Beacon, StomperTrainingPost
+from swarm import NO_TARGET, SWARM_COLUMNS
+from tile import TILE_COLUMNS
+
+# File layout: fixed preamble, JSON header, then packed little-endian columns aligned for mmap
+SAVE_MAGIC = b'GLIMSAVE'
+SAVE_VERSION = 2
+READABLE_VERSIONS = (1, 2) # Version 1 saves hold the fixed 101-tile world
+_PREAMBLE = struct.Struct('<8sHHI') # magic, version, reserved, header length
+_ALIGN = 64
+
+STRUCTURE_KINDS = (Wellspring, Beacon, StomperTrainingPost)
+NO_GLIM = -1
+STRUCTURE_RECORD = np.dtype([
+    ('kind', '<i1'), ('tile', '<i4'), ('timer', '<f8'), ('paused', '?'), ('training', '?'),
+    ('glim', '<i4'), ('trained', '<i4'),
+])
+HEADER_KEYS = ('frame', 'time', 'life_essence', 'glim_cap', 'skill_tree_unlocked', 'skill_points', 'skills')
+# Glim columns an autosave copies a slice of rows per frame. Types are copied whole in the last frame,
+# with the training posts that must agree with them
+SLICED_GLIM_COLUMNS = tuple(name for name in SWARM_COLUMNS if name != 'glim_type')
+
+def _aligned(offset):
+    return -(-offset // _ALIGN) * _ALIGN
+
+def _structure_records(structures):
+    records = np.zeros(len(structures), dtype=STRUCTURE_RECORD)
+    for record, structure in zip(records, structures):
+        record['kind'] = STRUCTURE_KINDS.index(type(structure))
+        record['tile'] = structure.tile.x_pos // TILE_SIZE
+        if isinstance(structure, Wellspring):
+            record['timer'] = structure.passive_timer
+        elif isinstance(structure, Beacon):
+            record['timer'] = structure.pulse_timer
+        else:
+            record['timer'] = structure.training_timer
+            record['paused'] = structure.is_paused
+            record['training'] = structure.is_training
+            record['glim'] = NO_GLIM if structure.glim_to_train is None else structure.glim_to_train
+            record['trained'] = structure.trained_count
+    return records
+
+def _restore_structure(record, tile):
+    structure = STRUCTURE_KINDS[record['kind']](tile)
+    if isinstance(structure, Wellspring):
+        structure.passive_timer = float(record['timer'])
+    elif isinstance(structure, Beacon):
+        structure.pulse_timer = float(record['timer'])
+    else:
+        structure.training_timer = float(record['timer'])
+        structure.is_paused = bool(record['paused'])
+        structure.is_training = bool(record['training'])
+        structure.glim_to_train = None if record['glim'] == NO_GLIM else int(record['glim'])
+        structure.trained_count = int(record['trained'])
+    return structure
+
+def snapshot(sim, copied_glims=()):
+    # Copies everything a save needs, so the file can be written while the game keeps running. Glim
+    # columns named in copied_glims are left out, for a caller that has copied them already
+    game_state = sim.game_state
+    header = {
+        'saved_at': time.time(),
+        'frame': sim.frame,
+        'time': sim.time,
+        'first_tile': sim.grid.first_tile,
+        'center_index': sim.grid.center_index,
+        'world_seed': sim.grid.seed,
+        'life_essence': game_state.life_essence,
+        'glim_cap': game_state.glim_cap,
+        'skill_tree_unlocked': game_state.skill_tree_unlocked,
+        'skill_points': game_state.skill_points,
+        'skills': {name: skill['unlocked'] for name, skill in game_state.skills.items()},
+    }
+    columns = {f"tile.{name}": column.copy() for name, column in sim.grid.tile_columns().items()}
+    columns.update({f"glim.{name}": column.copy() for name, column in game_state.glims.columns().items()
+                    if name not in copied_glims})
+    columns['structures'] = _structure_records(game_state.structures)
+    return header, columns
+
+def write_snapshot(path, header, columns):
+    offset = 0
+    layout = {}
+    for name, column in columns.items():
+        layout[name] = {'dtype': column.dtype.descr if column.dtype.names else column.dtype.newbyteorder('<').str,
+                        'offset': offset, 'length': len(column)}
+        offset = _aligned(offset + column.nbytes)
+    header_bytes = json.dumps(dict(header, columns=layout)).encode()
+    data_start = _aligned(_PREAMBLE.size + len(header_bytes))
+
+    # Written beside the target and swapped in, so a crash mid-write never leaves a torn save
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(_PREAMBLE.pack(SAVE_MAGIC, SAVE_VERSION, 0, len(header_bytes)))
+        f.write(header_bytes)
+        for name, column in columns.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(np.ascontiguousarray(column, dtype=column.dtype.newbyteorder('<')).tobytes())
+    os.replace(temp_path, path)
+    return path
+
+def save(sim, path=SAVE_PATH):
+    return write_snapshot(path, *snapshot(sim))
+
+def read(path):
+    with open(path, 'rb') as f:
+        magic, version, _, header_length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != SAVE_MAGIC:
+            raise ValueError(f"{path} is not a Glim Grid save")
+        if version not in READABLE_VERSIONS:
+            raise ValueError(f"Unsupported save version {version} (expected {SAVE_VERSION})")
+        header = json.loads(f.read(header_length))
+
+    data_start = _aligned(_PREAMBLE.size + header_length)
+    columns = {}
+    for name, entry in header.pop('columns').items():
+        dtype = np.dtype([tuple(field) for field in entry['dtype']] if isinstance(entry['dtype'], list) else entry['dtype'])
+        if entry['length'] == 0:
+            columns[name] = np.empty(0, dtype=dtype)
+        else:
+            # Copy-on-write maps: pages are read lazily and edits never reach the file
+            columns[name] = np.memmap(path, dtype=dtype, mode='c', offset=data_start + entry['offset'],
+                                      shape=(entry['length'],))
+    return header, columns
+
+def _check(grid, header, columns, first_tile, shift):
+    # Everything load relies on is looked at before it touches the game, so a broken save leaves the
+    # running one as it was
+    missing = [key for key in HEADER_KEYS if key not in header]
+    missing += [name for name in [f"tile.{name}" for name in TILE_COLUMNS] + [f"glim.{name}" for name in SWARM_COLUMNS]
+                + ['structures'] if name not in columns]
+    if missing:
+        raise ValueError(f"Save is missing {', '.join(missing)}")
+    length = len(columns['tile.state'])
+    grid.check_span(first_tile + shift, length)
+    records = columns['structures']
+    tiles = records['tile'] + shift
+    if len(records) and (records['kind'].min() < 0 or records['kind'].max() >= len(STRUCTURE_KINDS)
+                         or tiles.min() < first_tile + shift or tiles.max() >= first_tile + shift + length):
+        raise ValueError("Save holds a structure off its tiles or of an unknown kind")
+
+def load(sim, path=SAVE_PATH, mapped=True):
+    # With mapped, Glim columns stay copy-on-write views of the file. Pass False when the running game
+    # will write that file again: Windows won't replace a file that is still mapped
+    header, columns = read(path)
+    game_state, grid = sim.game_state, sim.grid
+    # Everything is placed relative to the world's center, so saves from a differently sized world line up
+    first_tile = header.get('first_tile', 0)
+    shift = grid.center_index - header.get('center_index', len(columns.get('tile.state', ())) // 2)
+    _check(grid, header, columns, first_tile, shift)
+    for structure in list(game_state.structures):
+        game_state.detach_structure(structure)
+    # Timers resume from the saved clock, so a loaded game fires events on the frames the saved one would
+    sim.scheduler.now = header['time']
+    grid.seed = header.get('world_seed', grid.seed)
+
+    tile_columns = {name[len('tile.'):]: column for name, column in columns.items() if name.startswith('tile.')}
+    grid.load_tile_columns(tile_columns, first_tile + shift)
+    swarm = game_state.glims
+    glim_columns = {name[len('glim.'):]: column for name, column in columns.items() if name.startswith('glim.')}
+    if not mapped:
+        glim_columns = {name: np.array(column) for name, column in glim_columns.items()}
+    swarm.load_columns(glim_columns)
+    if shift:
+        swarm.x[:] += shift * TILE_SIZE
+        swarm.origin_x[:] += shift * TILE_SIZE
+        swarm.target[swarm.target != NO_TARGET] += shift
+    for record in columns['structures']:
+        game_state.add_structure(_restore_structure(record, grid.tiles[int(record['tile']) + shift]))
+
+    game_state.life_essence = header['life_essence']
+    game_state.glim_cap = header['glim_cap']
+    game_state.skill_tree_unlocked = header['skill_tree_unlocked']
+    game_state.skill_points = header['skill_points']
+    for name, unlocked in header['skills'].items():
+        if name in game_state.skills:
+            game_state.skills[name]['unlocked'] = unlocked
+    sim.frame = header['frame']
+    sim.time = header['time']
+    return header
+
+class Autosaver:
+    def __init__(self, path=SAVE_PATH, interval=AUTOSAVE_INTERVAL, rows_per_frame=AUTOSAVE_ROWS_PER_FRAME):
+        self.path = path
+        self.interval = interval
+        self.rows_per_frame = rows_per_frame
+        self.saves = 0
+        self.last_error = None
+        self._elapsed = 0.0
+        self._thread = None
+        self._glim_parts = None # Slices of the Glim columns copied so far, while a save is being gathered
+        self._copied = 0
+
+    @property
+    def busy(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def update(self, sim, delta_time):
+        # Glim columns are copied rows_per_frame rows at a time, every column of a row in the same frame, so
+        # a big swarm never stalls one frame. The frame that copies the last rows snaps the rest; joining
+        # the slices, encoding and disk I/O run in the background
+        self._elapsed += delta_time
+        if self._glim_parts is None:
+            if self._elapsed < self.interval or self.busy:
+                return False
+            self._elapsed = 0.0
+            self._glim_parts = {name: [] for name in SLICED_GLIM_COLUMNS}
+            self._copied = 0
+        live = sim.game_state.glims.columns()
+        end = min(self._copied + self.rows_per_frame, len(live['x']))
+        for name, parts in self._glim_parts.items():
+            parts.append(live[name][self._copied:end].copy())
+        self._copied = end
+        # Glims bought meanwhile are picked up by later slices; the swarm never shrinks
+        if end < len(live['x']):
+            return False
+        header, columns = snapshot(sim, copied_glims=self._glim_parts)
+        self._thread = threading.Thread(target=self._write, args=(header, columns, self._glim_parts), daemon=True)
+        self._glim_parts = None
+        self._thread.start()
+        return True
+
+    def _write(self, header, columns, glim_parts):
+        try:
+            columns.update({f"glim.{name}": np.concatenate(parts) for name, parts in glim_parts.items()})
+            write_snapshot(self.path, header, columns)
+            self.saves += 1
+        except OSError as error:
+            self.last_error = error
+
+    def take_error(self):
+        # Hands back the last failed write once, so the caller reports it a single time
+        error, self.last_error = self.last_error, None
+        return error
+
+    def wait(self):
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,74 @@
+import heapq
+import itertools
+
+class Event:
+    __slots__ = ('time', 'seq', 'callback', 'args', 'cancelled')
+
+    def __init__(self, time, seq, callback, args):
+        self.time = time
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.time, self.seq) < (other.time, other.seq)
+
+class Scheduler:
+    def __init__(self):
+        self.now = 0.0
+        self.fired = 0 # Events fired by the last advance()
+        self._heap = []
+        self._seq = itertools.count()
+        self._cancelled = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, delay, callback, *args):
+        return self.schedule_at(self.now + delay, callback, *args)
+
+    def schedule_at(self, time, callback, *args):
+        event = Event(time, next(self._seq), callback, args)
+        heapq.heappush(self._heap, event)
+        return event
+
+    def cancel(self, event):
+        # Cancelled events stay in the heap and are skipped when they come due, unless they pile up
+        if event is None or event.cancelled:
+            return
+        event.cancelled = True
+        self._cancelled += 1
+        if self._cancelled > 64 and self._cancelled * 2 > len(self._heap):
+            self._heap = [e for e in self._heap if not e.cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+    def remaining(self, event):
+        return max(event.time - self.now, 0.0)
+
+    def advance(self, delta_time):
+        # Fires everything due by the new time in order; callbacks see `now` set to their own due time
+        # so a repeating event can reschedule itself without drifting. Non-None results are returned
+        target = self.now + delta_time
+        results = []
+        self.fired = 0
+        while self._heap and self._heap[0].time <= target:
+            event = heapq.heappop(self._heap)
+            if event.cancelled:
+                self._cancelled -= 1
+                continue
+            event.cancelled = True # Fired events count as spent, so a late cancel() is a no-op
+            self.now = event.time
+            self.fired += 1
+            result = event.callback(*event.args)
+            if result is not None:
+                results.append(result)
+        self.now = target
+        return results
+
+    def skip(self, seconds):
+        # Moves the clock without firing anything; pending events keep their distance from now
+        self.now += seconds
+        for event in self._heap:
+            event.time += seconds
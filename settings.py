@@ -8,13 +8,17 @@ ACTIVE_ZONE_RADIUS = 10
 CORE_TILE_INDEX = 10
 CORE_TILE_TOUGHNESS = 2000
 
-WORLD_SIZE_TILES = 101
+WORLD_SIZE_TILES = (1 << 14) + 1 # Width of the tile index space; chunks inside it are generated on demand
 WORLD_WIDTH_PIXELS = WORLD_SIZE_TILES * TILE_SIZE
+WORLD_CHUNK_TILES = 32 # Tiles generated, drawn and compressed together
+WORLD_GENERATE_MARGIN = 2 # Chunks kept generated past the innermost mountains and around the camera
+WORLD_SEED = 1 # Seeds each chunk's mountain shapes, so the world looks the same in whatever order it is explored
 
 BASE_TOUGHNESS = 10
 TOUGHNESS_MULTIPLIER = 1.5
 PLAYER_CLICK_STRENGTH = 1
 MOUNTAIN_TOUGHNESS = 1000
+MAX_TILE_TOUGHNESS = 2 ** 62 # Toughness stops growing here so far tiles still fit the int64 column
 
 PASSIVE_INCOME_AMOUNT = 1
 PASSIVE_INCOME_INTERVAL = 2.0
@@ -24,6 +28,9 @@ GLIM_SPEED = 40
 GLIM_CULTIVATION_RATE = 1.0
 GLIM_CULTIVATION_STRENGTH = 1
 GLIM_MINING_STRENGTH = 5
+GLIM_FRONTIER_SPREAD = 8 # Barren tiles past each frontier that standard Glims are spread over
+GLIM_BOB_DENSITY_LIMIT = 2000 # Visible Glims above which the bob animation is skipped
+GLIM_CROWD_THRESHOLD = 12 # Glims over one tile above which a single crowd sprite with a count is drawn
 
 WELLSPRING_COST = 150
 WELLSPRING_INCOME_AMOUNT = 5
@@ -34,19 +41,50 @@ BEACON_SPEED_BOOST = 1.5
 BEACON_RANGE = TILE_SIZE * 2.5
 BEACON_STACK_MODIFIER = 0.5 # New: Subsequent beacons are 50% as effective
 MAX_BEACON_BUFF = 2.5 # New: Max speed buff from beacons is 250%
+BEACON_BUFF_BAND_WIDTH = TILE_SIZE // 4 # Resolution of the precomputed buff lookup
 
 STOMPER_POST_COST = 250
 STOMPER_CONVERSION_COST = 75
 STOMPER_TRAINING_TIME = 10.0
 STOMPER_POST_CAPACITY = 10
+STOMPER_POST_RETRY_INTERVAL = 0.5 # Seconds between an idle post's checks for essence and a trainable Glim
 
 STOMPER_LUNGE_DISTANCE = 64
 STOMPER_LUNGE_SPEED_MULTIPLIER = 6
 STOMPER_LUNGE_COOLDOWN = 0.5
+STOMPER_TARGET_SPREAD = 3 # Nearest mountains on each side a stomper may be sent to
 
 STRUCTURE_REFUND_PERCENTAGE = 0.75 # New: Get 75% of cost back
 
 CAMERA_SPEED = 300
+TILE_PULSE_LEVELS = 32 # Distinct core pulse shades; the cached grid strip redraws on a level change
+MOUNTAIN_SILHOUETTES = 8 # Distinct mountain sprites shared by every mountain tile
+DIRTY_RECT_UPDATES = True # Push only changed screen areas while the camera is still; F7 toggles
+DIRTY_RECT_MAX_COVERAGE = 0.5 # Share of the screen past which changed areas are pushed with one flip instead
+DIRTY_RECT_BAND_WIDTH = TILE_SIZE * 4 # Glims are gathered into one changed area per band of this width
+
+SIM_TIMESTEP = 1 / 60 # Fixed simulation step in seconds
+SIM_MAX_STEPS_PER_FRAME = 4 # Steps run per frame at most; time beyond that is dropped so a slow frame can't snowball
+SIM_SCREEN_HEIGHT = 1080 # Screen height assumed by headless runs
+SIM_WORKERS = 0 # Processes sharing the swarm step; 0 or 1 steps it in-process
+SIM_SHARD_MIN_GLIMS = 4096 # Fewest Glims worth handing to another process
+
+PROFILE_WINDOW_FRAMES = 240 # Rolling window for the overlay percentiles
+PROFILE_TRACE_FRAMES = 36000 # Frames kept for trace export
+PROFILE_TRACE_PATH = "profile_trace" # Exported as .json and .csv
+
+TEXT_CACHE_SIZE = 512 # Rendered text surfaces kept by the shared LRU cache
+
+FLOATING_TEXT_MAX_PER_FRAME = 64 # Amount popups spawned per frame; the rest are dropped
+FLOATING_TEXT_POOL_SIZE = 256 # Idle floating texts kept for reuse
+FLOATING_TEXT_COALESCE_CELL = TILE_SIZE # Same-frame amounts within one cell merge into one popup
+INCOME_RATE_WINDOW = 5.0 # Seconds averaged by the income-rate display
+OFFLINE_MAX_SEGMENT = 10.0 # Longest fast-forward span before income-gated events are rechecked
+OFFLINE_MAX_SECONDS = 24 * 3600 # Longest absence credited when a save is loaded
+SAVE_PATH = "savegame.glim" # Loaded on start, autosaved while playing and written on exit
+AUTOSAVE_INTERVAL = 60.0 # Seconds between background autosaves
+AUTOSAVE_ROWS_PER_FRAME = 100000 # Glim rows an autosave copies per frame; a big swarm is copied over several
+REPLAY_PATH = "replay.json" # F6 starts and stops recording; the starting save is kept beside it
 PI = math.pi
 
 # Asset Paths
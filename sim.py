@@ -0,0 +1,344 @@
+import argparse
+import json
+import random
+import time
+from collections import Counter
+import numpy as np
+from settings import (SIM_TIMESTEP, SIM_MAX_STEPS_PER_FRAME, SIM_SCREEN_HEIGHT, SIM_WORKERS, WORLD_SEED,
+                      PLAYER_CLICK_STRENGTH, TILE_SIZE)
+from grid import Grid
+from game_state import GameState
+from swarm import GLIM_TYPES, GlimSwarm
+from tile import TILE_STATES
+from parallel import SharedGlimSwarm
+from profiler import FrameProfiler
+from structure import Wellspring, Beacon, StomperTrainingPost
+import savegame
+import offline
+import replay
+from scheduler import Scheduler
+
+CORE_CULTIVATION_REWARD = 1000
+BUILDABLE = {"wellspring": Wellspring, "beacon": Beacon, "stomper_post": StomperTrainingPost}
+
+# Worlds --scenario builds: every skill unlocked, `land` tiles cultivated on each side of the core, the
+# standard Glims and stompers spread evenly over them and the structures spaced out along them
+SCENARIOS = {
+    'large': {'glims': 1800, 'stompers': 200, 'land': 10},
+    'beacons': {'glims': 1800, 'stompers': 200, 'land': 10, 'structures': {'beacon': 3}},
+    'stompers': {'glims': 200, 'stompers': 800, 'land': 10, 'structures': {'beacon': 1}},
+    'posts': {'glims': 1000, 'stompers': 50, 'land': 10, 'structures': {'stomper_post': 4, 'beacon': 1}},
+}
+
+class Simulation:
+    def __init__(self, screen_height=SIM_SCREEN_HEIGHT, timestep=SIM_TIMESTEP, profiler=None, workers=SIM_WORKERS,
+                 seed=None, max_steps=SIM_MAX_STEPS_PER_FRAME):
+        self.screen_height = screen_height
+        self.rng = random.Random(seed)
+        self.scheduler = Scheduler()
+        glims = SharedGlimSwarm(workers, rng=self.rng) if workers > 1 else GlimSwarm(rng=self.rng)
+        self.game_state = GameState(self.scheduler, glims, self.rng)
+        self.grid = Grid(screen_height, self.scheduler, WORLD_SEED if seed is None else seed)
+        self.timestep = timestep
+        self.max_steps = max_steps
+        self.profiler = profiler or FrameProfiler()
+        self.frame = 0
+        self.time = 0.0
+        self.view = None
+        self.recorder = None # A ReplayRecorder while a replay is being recorded
+        self._accumulator = 0.0
+
+    def advance(self, elapsed):
+        # Runs as many fixed steps as fit into the elapsed real time, carrying the remainder. When steps
+        # cost more than they cover, the backlog past max_steps is dropped and the game slows down instead
+        self._accumulator += elapsed
+        effects = []
+        steps = 0
+        while self._accumulator >= self.timestep and steps < self.max_steps:
+            self._accumulator -= self.timestep
+            effects.extend(self.step())
+            steps += 1
+        if self._accumulator >= self.timestep:
+            self._accumulator = 0.0
+        return effects
+
+    def run(self, seconds):
+        for _ in range(round(seconds / self.timestep)):
+            self.step()
+
+    def step(self):
+        delta_time = self.timestep
+        game_state = self.game_state
+        profiler = self.profiler
+        effects = []
+
+        with profiler.scope('grid_update'):
+            self.grid.update(delta_time)
+
+        # Tile income, wellspring income and stomper training all fire from the scheduler
+        with profiler.scope('scheduled_events'):
+            effects.extend(self._collect(self.scheduler.advance(delta_time)))
+
+        with profiler.scope('glim_update'):
+            glim_essence, glim_effects = game_state.glims.update(delta_time, self.grid, game_state.glim_targeting, game_state.beacon_index)
+            if glim_essence > 0: game_state.add_essence(glim_essence)
+            effects.extend(glim_effects)
+
+        self.frame += 1
+        self.time += delta_time
+        return self._apply_rules(effects)
+
+    def _collect(self, results):
+        effects = []
+        for essence, effect in results:
+            if essence > 0: self.game_state.add_essence(essence)
+            if effect: effects.append(effect)
+        return effects
+
+    def close(self):
+        # Stops swarm worker processes, if any; the simulation keeps working in-process afterwards
+        if isinstance(self.game_state.glims, SharedGlimSwarm):
+            self.game_state.glims.close()
+
+    def fast_forward(self, seconds):
+        # Closed-form catch-up for long absences; returns a report of what was earned
+        report = offline.fast_forward(self, seconds)
+        self.frame += round(seconds / self.timestep)
+        return report
+
+    def apply_input(self, action, *args):
+        # Every player action that changes the game goes through here, so a replay can log and re-drive it.
+        # Returns effects like step() does
+        if self.recorder:
+            self.recorder.record(action, *args)
+        game_state, grid = self.game_state, self.grid
+        if action == 'click':
+            world_x, world_y = args
+            clicked_structure = grid.get_structure_at_world_pos(world_x, world_y)
+            if isinstance(clicked_structure, StomperTrainingPost):
+                return [{'type': 'notification', 'text': f"Training {clicked_structure.toggle_pause()}"}]
+            return self.click_tile(world_x, world_y, PLAYER_CLICK_STRENGTH)
+        if action == 'purchase_glim':
+            game_state.purchase_glim(*grid.center_tile_pos)
+        elif action == 'build':
+            item, world_x, world_y = args
+            tile = grid.get_tile_at_world_pos(world_x, world_y)
+            if tile and tile.is_buildable() and item in BUILDABLE:
+                game_state.place_structure(BUILDABLE[item], tile)
+        elif action == 'destroy':
+            structure = grid.get_structure_at_world_pos(*args)
+            if structure:
+                return [{'type': 'notification', 'text': f"Structure sold for {game_state.remove_structure(structure)} essence."}]
+        elif action == 'purchase_skill':
+            name, = args
+            if game_state.purchase_skill(name, grid.center_tile_pos):
+                return [{'type': 'notification', 'text': f"{name.replace('_', ' ').title()} unlocked!"}]
+        else:
+            raise ValueError(f"Unknown input {action!r}")
+        return []
+
+    def set_view(self, x0, x1):
+        # Chunks compress by distance from the camera, which moves income timers, so view changes that
+        # reach the grid are recorded like any other input
+        self.view = (x0, x1)
+        if self.grid.set_view(x0, x1) and self.recorder:
+            self.recorder.record('view', x0, x1)
+
+    def click_tile(self, world_x, world_y, click_strength):
+        result = self.grid.handle_click(world_x, world_y, click_strength)
+        if result == "core_cultivated":
+            return self._apply_rules([{'type': 'core_cultivated'}])
+        if isinstance(result, (int, float)) and result > 0:
+            self.game_state.add_essence(result)
+        return []
+
+    def _apply_rules(self, effects):
+        game_state = self.game_state
+        resolved = []
+        for effect in effects:
+            if effect.get('type') == 'core_cultivated':
+                if not game_state.skill_tree_unlocked:
+                    game_state.skill_tree_unlocked = True
+                    game_state.skill_points += 1
+                    resolved.append({'type': 'notification', 'text': "Core Stabilized! Skill Tree Unlocked!"})
+                game_state.add_essence(CORE_CULTIVATION_REWARD)
+            elif effect.get('type') == 'notification':
+                resolved.append(effect)
+                if effect['text'] == 'Mountain Cleared!':
+                    game_state.skill_points += 1
+                    resolved.append({'type': 'notification', 'text': "Skill Point Gained!"})
+            else:
+                resolved.append(effect)
+        return resolved
+
+    def summary(self):
+        game_state = self.game_state
+        return {
+            'frame': self.frame,
+            'time': round(self.time, 6),
+            'life_essence': game_state.life_essence,
+            'skill_points': game_state.skill_points,
+            'skill_tree_unlocked': game_state.skill_tree_unlocked,
+            'skills': {name: skill['unlocked'] for name, skill in game_state.skills.items()},
+            'glims': {glim_type: game_state.glims.count_of(glim_type) for glim_type in GLIM_TYPES},
+            'structures': dict(Counter(struct.name for struct in game_state.structures)),
+            'tiles': ''.join(TILE_STATES[state][0] for state in self.grid.tile_states().tolist()),
+        }
+
+def _build(args, workers=None, scenario=None):
+    sim = Simulation(timestep=args.dt, workers=args.workers if workers is None else workers, seed=args.seed)
+    if args.load_game:
+        savegame.load(sim, args.load_game)
+    for _ in range(args.glims):
+        sim.game_state.purchase_glim(*sim.grid.center_tile_pos)
+    scenario = scenario or args.scenario
+    if scenario:
+        _build_scenario(sim, SCENARIOS[scenario])
+    return sim
+
+def _build_scenario(sim, scenario):
+    game_state, grid = sim.game_state, sim.grid
+    for skill in game_state.skills.values():
+        skill['unlocked'] = True
+    lo, hi = grid.center_index - scenario['land'], grid.center_index + scenario['land'] + 1
+    for tile in grid.tiles[lo:hi]:
+        while tile.state != 'living':
+            tile.take_damage(tile.current_toughness)
+    wanted = [BUILDABLE[item] for item, count in scenario.get('structures', {}).items() for _ in range(count)]
+    buildable = [tile for tile in grid.tiles[lo:hi] if tile.is_buildable()]
+    for i, structure_class in enumerate(wanted):
+        game_state.add_structure(structure_class(buildable[i * len(buildable) // len(wanted)]))
+    for glim_type, count in (('standard', scenario['glims']), ('stomper', scenario.get('stompers', 0))):
+        for x in np.linspace(lo * TILE_SIZE, hi * TILE_SIZE, count, endpoint=False).tolist():
+            game_state.glims.add(x, grid.ground_y, glim_type)
+
+def validate_fast_forward(args):
+    if args.scenario != 'all':
+        return _validate_fast_forward(args, args.scenario)
+    errors = []
+    for scenario in SCENARIOS:
+        print(f"{scenario}:")
+        errors.append(_validate_fast_forward(args, scenario))
+    return max(errors)
+
+def _validate_fast_forward(args, scenario):
+    # Runs the same world both ways and reports how far the closed form drifts from stepping
+    stepped = _build(args, scenario=scenario)
+    initial = stepped.game_state.life_essence
+    start = time.perf_counter()
+    stepped.run(args.seconds)
+    stepped_wall = time.perf_counter() - start
+
+    forwarded = _build(args, scenario=scenario)
+    start = time.perf_counter()
+    report = forwarded.fast_forward(args.seconds)
+    forwarded_wall = time.perf_counter() - start
+
+    expected = stepped.game_state.life_essence - initial
+    actual = forwarded.game_state.life_essence - initial
+    error = abs(actual - expected) / max(abs(expected), 1)
+    print(f"stepped       earned {expected:>14} in {stepped_wall:8.3f}s")
+    print(f"fast-forward  earned {actual:>14} in {forwarded_wall:8.3f}s ({report['segments']} segments)")
+    stepped_tiles, forwarded_tiles = stepped.summary()['tiles'], forwarded.summary()['tiles']
+    print(f"relative error {error:.4%}; tiles {stepped_tiles == forwarded_tiles and 'match' or 'differ'} "
+          f"({stepped_tiles.count('l')} vs {forwarded_tiles.count('l')} living)")
+    return error
+
+def validate_workers(args):
+    # Steps the same seeded world in-process and sharded across workers; every column must match exactly
+    if args.seed is None:
+        args.seed = 0
+    single = _build(args, workers=0)
+    start = time.perf_counter()
+    single.run(args.seconds)
+    single_wall = time.perf_counter() - start
+
+    sharded = _build(args)
+    # Shard even small swarms so the split itself is what gets checked
+    sharded.game_state.glims.min_shard = 1
+    start = time.perf_counter()
+    try:
+        sharded.run(args.seconds)
+    finally:
+        sharded.close()
+    sharded_wall = time.perf_counter() - start
+
+    single_columns, sharded_columns = single.game_state.glims.columns(), sharded.game_state.glims.columns()
+    differing = [name for name in single_columns
+                 if single_columns[name].tobytes() != sharded_columns[name].tobytes()]
+    if single.summary() != sharded.summary():
+        differing.append('summary')
+    print(f"in-process       {single_wall:8.3f}s")
+    print(f"{args.workers} workers        {sharded_wall:8.3f}s")
+    print(f"{'bit-identical' if not differing else 'differs in ' + ', '.join(differing)}")
+    return not differing
+
+def play_replay(args):
+    data = replay.read(args.replay)
+    sim = Simulation(data['screen_height'], data['timestep'], workers=args.workers)
+    start = time.perf_counter()
+    try:
+        identical = replay.play(sim, data)
+    finally:
+        sim.close()
+    elapsed = time.perf_counter() - start
+    print(f"Replayed {data['frames']} frames and {len(data['inputs'])} inputs in {elapsed:.2f}s "
+          f"({data['frames'] * data['timestep'] / max(elapsed, 1e-9):.0f}x real time)")
+    print('final state identical' if identical else 'final state differs from the recording')
+    return identical
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run Glim Grid headless as fast as the CPU allows.")
+    parser.add_argument('--seconds', type=float, default=60.0, help="simulated seconds to run")
+    parser.add_argument('--dt', type=float, default=SIM_TIMESTEP, help="fixed timestep in seconds")
+    parser.add_argument('--glims', type=int, default=0, help="standard Glims to purchase before the run")
+    parser.add_argument('--save', help="write the final state summary to this JSON file")
+    parser.add_argument('--load-game', help="start from this save game instead of a new world")
+    parser.add_argument('--save-game', help="write the final state as a save game to this path")
+    parser.add_argument('--fast-forward', action='store_true', help="integrate the run in closed form instead of stepping")
+    parser.add_argument('--workers', type=int, default=SIM_WORKERS, help="processes sharing the swarm step")
+    parser.add_argument('--seed', type=int, help="seed for the random number generator")
+    parser.add_argument('--scenario', choices=list(SCENARIOS) + ['all'],
+                        help="start from a prepared world; with --validate, 'all' checks every one")
+    parser.add_argument('--validate', action='store_true',
+                        help="compare --fast-forward or --workers against a plain stepped run and exit")
+    parser.add_argument('--replay', help="play back a recorded replay and check it ends in the recorded state")
+    args = parser.parse_args(argv)
+    if args.scenario == 'all' and (not args.validate or args.workers > 1):
+        parser.error("--scenario all only goes with --validate of fast-forward")
+
+    if args.replay:
+        if not play_replay(args):
+            raise SystemExit(1)
+        return
+
+    if args.validate:
+        if args.workers > 1:
+            validate_workers(args)
+        else:
+            validate_fast_forward(args)
+        return
+
+    sim = _build(args)
+    start = time.perf_counter()
+    try:
+        if args.fast_forward:
+            sim.fast_forward(args.seconds)
+        else:
+            sim.run(args.seconds)
+    finally:
+        sim.close()
+    elapsed = time.perf_counter() - start
+
+    summary = sim.summary()
+    summary['wall_seconds'] = round(elapsed, 3)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if args.save_game:
+        savegame.save(sim, args.save_game)
+    print(f"Simulated {sim.time:.1f}s ({sim.frame} steps) in {elapsed:.2f}s "
+          f"({sim.time / max(elapsed, 1e-9):.0f}x real time), essence {sim.game_state.life_essence}")
+
+if __name__ == '__main__':
+    main()
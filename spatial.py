@@ -0,0 +1,78 @@
+import numpy as np
+from settings import (TILE_SIZE, WORLD_SIZE_TILES, BEACON_RANGE, BEACON_SPEED_BOOST,
+                      BEACON_STACK_MODIFIER, MAX_BEACON_BUFF, BEACON_BUFF_BAND_WIDTH)
+
+def stacked_beacon_buff(beacon_count):
+    if beacon_count == 0:
+        return 1.0
+
+    # Calculate buff with diminishing returns
+    total_boost = 0
+    base_boost = BEACON_SPEED_BOOST - 1.0
+    for i in range(beacon_count):
+        total_boost += base_boost * (BEACON_STACK_MODIFIER ** i)
+
+    final_buff = 1.0 + total_boost
+    return min(final_buff, MAX_BEACON_BUFF)
+
+class BeaconIndex:
+    def __init__(self, world_size_tiles=WORLD_SIZE_TILES):
+        self.beacons_per_tile = np.zeros(world_size_tiles, dtype=np.int32)
+
+        # Buff field sampled in narrow x bands; a band is in range of a beacon
+        # when its center is within BEACON_RANGE of the beacon's center
+        band_count = -(-world_size_tiles * TILE_SIZE // BEACON_BUFF_BAND_WIDTH)
+        self.band_centers = np.arange(band_count) * BEACON_BUFF_BAND_WIDTH + BEACON_BUFF_BAND_WIDTH / 2
+        self.beacons_per_band = np.zeros(band_count, dtype=np.int32)
+        self.buff_by_band = np.ones(band_count)
+        self._buff_table = [1.0]
+        self._paced_starts = None # Unbuffed distance taking as long to walk as x = 0 to each band's start
+
+    def __len__(self):
+        return int(self.beacons_per_tile.sum())
+
+    def add(self, tile):
+        self._update(tile, 1)
+
+    def remove(self, tile):
+        self._update(tile, -1)
+
+    def _update(self, tile, delta):
+        self.beacons_per_tile[tile.x_pos // TILE_SIZE] += delta
+        in_range = np.abs(self.band_centers - tile.rect.centerx) <= BEACON_RANGE
+        self.beacons_per_band[in_range] += delta
+
+        while len(self._buff_table) <= self.beacons_per_band.max():
+            self._buff_table.append(stacked_beacon_buff(len(self._buff_table)))
+        self.buff_by_band[in_range] = np.take(self._buff_table, self.beacons_per_band[in_range])
+        self._paced_starts = None
+
+    def _band_of(self, xs):
+        return np.clip((np.asarray(xs) // BEACON_BUFF_BAND_WIDTH).astype(np.int64), 0, len(self.buff_by_band) - 1)
+
+    def buff_at(self, x):
+        return float(self.buff_by_band[self._band_of(x)])
+
+    def buffs_at(self, xs):
+        return self.buff_by_band[self._band_of(xs)]
+
+    def _paced(self, xs):
+        # Bands past either end of the world stretch on at the end band's buff, as buffs_at reads them
+        if self._paced_starts is None:
+            self._paced_starts = np.concatenate(([0.0], np.cumsum(BEACON_BUFF_BAND_WIDTH / self.buff_by_band)))
+        bands = self._band_of(xs)
+        return self._paced_starts[bands] + (xs - bands * BEACON_BUFF_BAND_WIDTH) / self.buff_by_band[bands]
+
+    def walk_lengths(self, from_xs, to_xs):
+        # How far a walk from from_xs to to_xs would reach at unbuffed speed in the time it takes
+        # with the buff of every band along the way
+        return np.abs(self._paced(to_xs) - self._paced(from_xs))
+
+    def walked_to(self, from_xs, to_xs, lengths):
+        # Where walks from from_xs towards to_xs stand once they have gone on for as long as
+        # covering `lengths` at unbuffed speed takes
+        direction = np.sign(to_xs - from_xs)
+        goal = self._paced(from_xs) + direction * lengths
+        bands = np.clip(np.searchsorted(self._paced_starts, goal, side='right') - 1, 0, len(self.buff_by_band) - 1)
+        xs = bands * BEACON_BUFF_BAND_WIDTH + (goal - self._paced_starts[bands]) * self.buff_by_band[bands]
+        return np.where(direction > 0, np.minimum(xs, to_xs), np.maximum(xs, to_xs))
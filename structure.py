@@ -4,7 +4,10 @@ from settings import (WELLSPRING_INCOME_AMOUNT, WELLSPRING_INCOME_INTERVAL,
                       WELLSPRING_COLOR_PRIMARY, WELLSPRING_COLOR_SECONDARY, TILE_SIZE, 
                       BEACON_COLOR_PRIMARY, BEACON_COLOR_SECONDARY, BEACON_RANGE, BEACON_RANGE_COLOR,
                       STOMPER_POST_COLOR_PRIMARY, STOMPER_POST_COLOR_SECONDARY,
-                      STOMPER_TRAINING_TIME, STOMPER_POST_CAPACITY, UI_TEXT_COLOR, STOMPER_CONVERSION_COST)
+                      STOMPER_TRAINING_TIME, STOMPER_POST_CAPACITY, UI_TEXT_COLOR, STOMPER_CONVERSION_COST,
+                      STOMPER_POST_RETRY_INTERVAL)
+from text_cache import render_text, get_font
+from atlas import atlas
 
 class Structure:
     def __init__(self, tile):
@@ -12,65 +15,116 @@ class Structure:
         self.tile.set_structure(self)
         self.rect = tile.rect.copy()
         self.name = self.__class__.__name__.lower()
+        self.sprite_id = ('structure', self.name)
+        self.scheduler = None
+        self.game_state = None
+        self._event = None
     
-    def update(self, delta_time, game_state=None):
-        return 0, None
+    def get_surface(self):
+        return atlas.get(self.sprite_id, self._create_surface)
+
+    @classmethod
+    def get_preview_surface(cls):
+        return atlas.get(('structure', cls.__name__.lower()), cls._create_surface)
+
+    def start(self, scheduler, game_state):
+        # Timed behaviour runs from scheduler events instead of being polled every frame
+        self.scheduler = scheduler
+        self.game_state = game_state
+        self._schedule()
+
+    def stop(self):
+        if self.scheduler:
+            self.scheduler.cancel(self._event)
+        self._event = None
+        self.scheduler = None
+
+    def _schedule(self):
+        pass
+
+    def _reschedule(self):
+        if self.scheduler:
+            self.scheduler.cancel(self._event)
+            self._event = None
+            self._schedule()
+
+    def fast_forward(self, seconds):
+        # Advances timers by a long span in closed form and returns the essence earned; the caller then
+        # skips the scheduler clock by the same span
+        return 0
     
     def draw(self, screen, camera_offset_x):
         on_screen_rect = self.rect.copy()
         on_screen_rect.x -= camera_offset_x
-        screen.blit(self.surface, on_screen_rect)
+        return screen.blit(self.get_surface(), on_screen_rect)
 
 class Wellspring(Structure):
     def __init__(self, tile):
         super().__init__(tile)
-        self.passive_timer = 0
-        self.surface = self._create_surface()
-
-    def _create_surface(self):
-        surface = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
-        pygame.draw.rect(surface, WELLSPRING_COLOR_PRIMARY, (8, 12, 16, 20), border_radius=3)
-        pygame.draw.rect(surface, WELLSPRING_COLOR_SECONDARY, (4, 8, 24, 4), border_radius=2)
-        pygame.draw.circle(surface, WELLSPRING_COLOR_SECONDARY, (16, 18), 5)
-        return surface
+        self._timer = 0.0
 
     @staticmethod
-    def get_preview_surface():
+    def _create_surface():
         surface = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
         pygame.draw.rect(surface, WELLSPRING_COLOR_PRIMARY, (8, 12, 16, 20), border_radius=3)
         pygame.draw.rect(surface, WELLSPRING_COLOR_SECONDARY, (4, 8, 24, 4), border_radius=2)
         pygame.draw.circle(surface, WELLSPRING_COLOR_SECONDARY, (16, 18), 5)
         return surface
     
-    def update(self, delta_time, game_state=None):
-        self.passive_timer += delta_time
-        if self.passive_timer >= WELLSPRING_INCOME_INTERVAL:
-            self.passive_timer -= WELLSPRING_INCOME_INTERVAL
-            return WELLSPRING_INCOME_AMOUNT, {'x': self.rect.centerx, 'y': self.rect.y, 'text': f"+{WELLSPRING_INCOME_AMOUNT}"}
-        return 0, None
+    @property
+    def passive_timer(self):
+        if self._event is not None:
+            return WELLSPRING_INCOME_INTERVAL - self.scheduler.remaining(self._event)
+        return self._timer
+
+    @passive_timer.setter
+    def passive_timer(self, value):
+        self._timer = value
+        self._reschedule()
+
+    def _schedule(self):
+        self._event = self.scheduler.schedule(WELLSPRING_INCOME_INTERVAL - self._timer, self._pay)
+
+    def _pay(self):
+        self._timer = 0.0
+        self._schedule()
+        return WELLSPRING_INCOME_AMOUNT, {'x': self.rect.centerx, 'y': self.rect.y, 'text': f"+{WELLSPRING_INCOME_AMOUNT}"}
+
+    def fast_forward(self, seconds):
+        elapsed = self.passive_timer + seconds
+        payouts = math.floor(elapsed / WELLSPRING_INCOME_INTERVAL)
+        self.passive_timer = elapsed - payouts * WELLSPRING_INCOME_INTERVAL
+        return payouts * WELLSPRING_INCOME_AMOUNT
 
 class Beacon(Structure):
     def __init__(self, tile):
         super().__init__(tile)
-        self.surface = self._create_surface()
-        self.pulse_timer = 0
+        self._pulse = 0.0
+        self._pulse_origin = 0.0
 
-    def _create_surface(self):
-        surface = pygame.Surface((TILE_SIZE, int(TILE_SIZE * 1.5)), pygame.SRCALPHA)
-        pygame.draw.rect(surface, BEACON_COLOR_PRIMARY, (12, 12, 8, TILE_SIZE * 2))
-        pygame.draw.circle(surface, BEACON_COLOR_SECONDARY, (16, 8), 8)
-        return surface
-    
     @staticmethod
-    def get_preview_surface():
+    def _create_surface():
         surface = pygame.Surface((TILE_SIZE, int(TILE_SIZE * 1.5)), pygame.SRCALPHA)
         pygame.draw.rect(surface, BEACON_COLOR_PRIMARY, (12, 12, 8, TILE_SIZE * 2))
         pygame.draw.circle(surface, BEACON_COLOR_SECONDARY, (16, 8), 8)
         return surface
 
-    def update(self, delta_time, game_state=None):
-        self.pulse_timer += delta_time * 2
-        return 0, None
+    # The pulse is read off the scheduler clock, so beacons cost nothing per frame
+    @property
+    def pulse_timer(self):
+        if self.scheduler is None:
+            return self._pulse
+        return (self.scheduler.now - self._pulse_origin) * 2
+
+    @pulse_timer.setter
+    def pulse_timer(self, value):
+        self._pulse = value
+        if self.scheduler is not None:
+            self._pulse_origin = self.scheduler.now - value / 2
+
+    def _schedule(self):
+        self._pulse_origin = self.scheduler.now - self._pulse / 2
+
 
     def draw(self, screen, camera_offset_x):
         center_x = self.tile.rect.centerx - camera_offset_x
@@ -84,68 +138,95 @@ class Beacon(Structure):
         
         range_surface = pygame.Surface((BEACON_RANGE * 2, BEACON_RANGE * 2), pygame.SRCALPHA)
         pygame.draw.circle(range_surface, temp_color, (BEACON_RANGE, BEACON_RANGE), BEACON_RANGE)
-        screen.blit(range_surface, (center_x - BEACON_RANGE, center_y - BEACON_RANGE))
+        range_rect = screen.blit(range_surface, (center_x - BEACON_RANGE, center_y - BEACON_RANGE))
 
-        on_screen_rect = self.surface.get_rect(midbottom=self.tile.rect.midtop)
+        surface = self.get_surface()
+        on_screen_rect = surface.get_rect(midbottom=self.tile.rect.midtop)
         on_screen_rect.x -= camera_offset_x
-        screen.blit(self.surface, on_screen_rect)
+        return range_rect.union(screen.blit(surface, on_screen_rect))
 
 class StomperTrainingPost(Structure):
     def __init__(self, tile):
         super().__init__(tile)
-        self.surface = self._create_surface()
         self.is_training = False
         self.is_paused = False
-        self.training_timer = 0.0
+        self._remaining = 0.0
         self.glim_to_train = None
         self.trained_count = 0
         self.capacity = STOMPER_POST_CAPACITY
-        self.font = pygame.font.SysFont("Arial", 12, bold=True)
-
-    def _create_surface(self):
-        surface = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
-        pygame.draw.rect(surface, STOMPER_POST_COLOR_PRIMARY, (2, 10, 28, 22), border_radius=4)
-        pygame.draw.rect(surface, STOMPER_POST_COLOR_SECONDARY, (8, 4, 16, 6))
-        pygame.draw.rect(surface, (0,0,0), (12, 16, 8, 8))
-        return surface
+        self.font = None
 
     @staticmethod
-    def get_preview_surface():
+    def _create_surface():
         surface = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
         pygame.draw.rect(surface, STOMPER_POST_COLOR_PRIMARY, (2, 10, 28, 22), border_radius=4)
         pygame.draw.rect(surface, STOMPER_POST_COLOR_SECONDARY, (8, 4, 16, 6))
         pygame.draw.rect(surface, (0,0,0), (12, 16, 8, 8))
         return surface
 
+    @property
+    def training_timer(self):
+        if self.is_training and self._event is not None:
+            return self.scheduler.remaining(self._event)
+        return self._remaining
+
+    @training_timer.setter
+    def training_timer(self, value):
+        self._remaining = value
+        self._reschedule()
+
     def toggle_pause(self):
+        self._remaining = self.training_timer
         self.is_paused = not self.is_paused
+        self._reschedule()
         return "Paused" if self.is_paused else "Resumed"
 
-    def update(self, delta_time, game_state):
+    def _schedule(self):
         if self.is_paused:
-            return 0, None
-
+            return
         if self.is_training:
-            self.training_timer -= delta_time
-            if self.training_timer <= 0:
-                if self.glim_to_train:
-                    self.glim_to_train.convert_to_stomper()
-                    self.trained_count += 1
-                self.is_training = False
-                self.glim_to_train = None
-                return 0, {'type': 'notification', 'text': 'Stomper training complete!'}
-        else:
-            if self.trained_count < self.capacity and game_state.life_essence >= STOMPER_CONVERSION_COST:
-                glim_to_train = game_state.find_trainable_glim()
-                if glim_to_train:
-                    game_state.life_essence -= STOMPER_CONVERSION_COST
-                    self.is_training = True
-                    self.glim_to_train = glim_to_train
-                    self.training_timer = STOMPER_TRAINING_TIME
-        return 0, None
+            self._event = self.scheduler.schedule(max(self._remaining, 0.0), self._finish_training)
+        elif self.trained_count < self.capacity:
+            self._event = self.scheduler.schedule(0.0, self._try_start_training)
+
+    def _try_start_training(self):
+        game_state = self.game_state
+        glim_to_train = None
+        if game_state.life_essence >= STOMPER_CONVERSION_COST:
+            glim_to_train = game_state.claim_trainable_glim()
+        if glim_to_train is None:
+            # Nothing to train yet; look again shortly rather than every frame
+            self._event = self.scheduler.schedule(STOMPER_POST_RETRY_INTERVAL, self._try_start_training)
+            return None
+        game_state.life_essence -= STOMPER_CONVERSION_COST
+        self.is_training = True
+        self.glim_to_train = glim_to_train
+        self._remaining = STOMPER_TRAINING_TIME
+        self._schedule()
+        return None
+
+    def _finish_training(self):
+        if self.glim_to_train is not None:
+            self.game_state.glims.convert_to_stomper(self.glim_to_train)
+            self.trained_count += 1
+        self.is_training = False
+        self.glim_to_train = None
+        self._remaining = 0.0
+        self._schedule()
+        return 0, {'type': 'notification', 'text': 'Stomper training complete!'}
+
+    def fast_forward(self, seconds):
+        # Training counts down in closed form; an idle post rechecks as soon as the clock is skipped
+        if not self.is_paused:
+            if self.is_training:
+                self._remaining = max(self.training_timer - seconds, 0.0)
+            self._reschedule()
+        return 0
 
     def draw(self, screen, camera_offset_x):
-        super().draw(screen, camera_offset_x)
+        if self.font is None:
+            self.font = get_font("Arial", 12, bold=True)
+        drawn_rect = super().draw(screen, camera_offset_x)
         on_screen_rect = self.rect.copy()
         on_screen_rect.x -= camera_offset_x
         
@@ -155,11 +236,11 @@ class StomperTrainingPost(Structure):
             progress_rect = pygame.Rect(on_screen_rect.left, on_screen_rect.bottom - 5, bar_width, 5)
             pygame.draw.rect(screen, (255, 255, 0), progress_rect)
         elif self.is_paused:
-            pause_surf = self.font.render("||", True, (255, 255, 0))
+            pause_surf = render_text(self.font, "||", True, (255, 255, 0))
             screen.blit(pause_surf, pause_surf.get_rect(center=on_screen_rect.center))
 
 
         count_text = f"{self.trained_count}/{self.capacity}"
-        text_surf = self.font.render(count_text, True, UI_TEXT_COLOR)
+        text_surf = render_text(self.font, count_text, True, UI_TEXT_COLOR)
         text_rect = text_surf.get_rect(center=(on_screen_rect.centerx, on_screen_rect.top - 8))
-        screen.blit(text_surf, text_rect)
+        return drawn_rect.union(screen.blit(text_surf, text_rect))
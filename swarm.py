@@ -0,0 +1,491 @@
+import math
+import random
+from collections import deque
+import numpy as np
+import pygame
+from glim import get_glim_surface, get_crowd_surface
+from text_cache import render_text, get_font
+from settings import (TILE_SIZE, GLIM_SPEED, GLIM_CULTIVATION_RATE, GLIM_CULTIVATION_STRENGTH,
+                      GLIM_MINING_STRENGTH, GLIM_COLOR_PALETTE, PI, STOMPER_LUNGE_DISTANCE,
+                      STOMPER_LUNGE_SPEED_MULTIPLIER, STOMPER_LUNGE_COOLDOWN, GLIM_BOB_DENSITY_LIMIT,
+                      GLIM_CROWD_THRESHOLD, UI_TEXT_COLOR, UI_BG_OVERLAY_COLOR, STOMPER_TARGET_SPREAD,
+                      DIRTY_RECT_BAND_WIDTH)
+
+GLIM_TYPES = ('standard', 'stomper')
+TYPE_STANDARD = 0
+TYPE_STOMPER = 1
+
+STATE_IDLE = 0
+STATE_MOVING_TO_ORIGIN = 1
+STATE_LUNGING = 2
+STATE_RETURNING = 3
+
+NO_TARGET = -1
+
+# Public column name -> backing array, in the order columns are saved
+SWARM_COLUMNS = {
+    'x': '_x', 'y': '_y', 'bob_timer': '_bob_timer', 'state': '_state', 'action_timer': '_action_timer',
+    'target': '_target', 'glim_type': '_type', 'color': '_color', 'origin_x': '_origin_x', 'origin_y': '_origin_y',
+}
+
+class GlimSwarm:
+    def __init__(self, capacity=1024, rng=None):
+        self.rng = rng if rng is not None else random.Random()
+        self.count = 0
+        self._capacity = 0
+        self._x = np.empty(0)
+        self._y = np.empty(0)
+        self._bob_timer = np.empty(0)
+        self._state = np.empty(0, dtype=np.int8)
+        self._action_timer = np.empty(0)
+        self._target = np.empty(0, dtype=np.int32)
+        self._type = np.empty(0, dtype=np.int8)
+        self._color = np.empty(0, dtype=np.int8)
+        self._origin_x = np.empty(0)
+        self._origin_y = np.empty(0)
+        self._grow(capacity)
+        self.crowd_threshold = GLIM_CROWD_THRESHOLD
+        self.sprites_saved = 0
+        self.drawn_rects = [] # Screen areas covered by the last draw
+        self.font = None
+        # What targets were last assigned from; they stay put until any of it changes
+        self._targets_key = None
+        self._targets_inputs = None
+        # Glims per type, and standard Glims nobody has claimed for training yet, in the order they joined
+        self._type_counts = [0] * len(GLIM_TYPES)
+        self._untrained = deque()
+
+
+    def _grow(self, capacity):
+        def resized(array, fill):
+            new_array = np.full(capacity, fill, dtype=array.dtype)
+            new_array[:self.count] = array[:self.count]
+            return new_array
+
+        self._x = resized(self._x, 0.0)
+        self._y = resized(self._y, 0.0)
+        self._bob_timer = resized(self._bob_timer, 0.0)
+        self._state = resized(self._state, STATE_IDLE)
+        self._action_timer = resized(self._action_timer, 0.0)
+        self._target = resized(self._target, NO_TARGET)
+        self._type = resized(self._type, TYPE_STANDARD)
+        self._color = resized(self._color, 0)
+        self._origin_x = resized(self._origin_x, np.nan)
+        self._origin_y = resized(self._origin_y, np.nan)
+        self._capacity = capacity
+
+    # Views over the live part of each column
+    @property
+    def x(self): return self._x[:self.count]
+    @property
+    def y(self): return self._y[:self.count]
+    @property
+    def bob_timer(self): return self._bob_timer[:self.count]
+    @property
+    def state(self): return self._state[:self.count]
+    @property
+    def action_timer(self): return self._action_timer[:self.count]
+    @property
+    def target(self): return self._target[:self.count]
+    @property
+    def glim_type(self): return self._type[:self.count]
+    @property
+    def color(self): return self._color[:self.count]
+    @property
+    def origin_x(self): return self._origin_x[:self.count]
+    @property
+    def origin_y(self): return self._origin_y[:self.count]
+
+    def __len__(self):
+        return self.count
+
+    def columns(self):
+        return {name: getattr(self, attr)[:self.count] for name, attr in SWARM_COLUMNS.items()}
+
+    def load_columns(self, columns):
+        # Arrays of the right dtype are adopted as-is, so copy-on-write memmaps load without copying
+        self.count = len(columns['x'])
+        for name, attr in SWARM_COLUMNS.items():
+            setattr(self, attr, np.asarray(columns[name], dtype=getattr(self, attr).dtype))
+        self._capacity = self.count
+        if self._capacity == 0:
+            self._grow(1024)
+        self._type_counts = np.bincount(self.glim_type, minlength=len(GLIM_TYPES)).tolist()
+        self._untrained = deque(np.flatnonzero(self.glim_type == TYPE_STANDARD).tolist())
+        self.retarget()
+
+    def add(self, x, y, glim_type='standard'):
+        if self.count == self._capacity:
+            self._grow(self._capacity * 2)
+        i = self.count
+        self._x[i] = x
+        self._y[i] = y
+        self._bob_timer[i] = self.rng.uniform(0, 2 * PI)
+        self._state[i] = STATE_IDLE
+        self._action_timer[i] = 0
+        self._target[i] = NO_TARGET
+        self._type[i] = GLIM_TYPES.index(glim_type)
+        self._type_counts[self._type[i]] += 1
+        if self._type[i] == TYPE_STANDARD:
+            self._untrained.append(i)
+        self._color[i] = self.rng.randrange(len(GLIM_COLOR_PALETTE))
+        self._origin_x[i] = np.nan
+        self._origin_y[i] = np.nan
+        self.count += 1
+        return i
+
+    def convert_to_stomper(self, index):
+        self._type_counts[self._type[index]] -= 1
+        self._type_counts[TYPE_STOMPER] += 1
+        self._type[index] = TYPE_STOMPER
+        self._state[index] = STATE_IDLE # Reset state on conversion
+        self.retarget()
+
+    def retarget(self):
+        # Forces a fresh assignment on the next update, for changes the cached key can't see
+        self._targets_key = None
+
+    def count_of(self, glim_type):
+        return self._type_counts[GLIM_TYPES.index(glim_type)]
+
+    def claim_untrained(self, index=None):
+        # Hands out the standard Glim that has waited longest, or takes a given one out of the queue.
+        # Glims converted some other way are dropped as they reach the front
+        untrained = self._untrained
+        if index is not None:
+            if index in untrained:
+                untrained.remove(index)
+            return index
+        while untrained:
+            index = untrained.popleft()
+            if self._type[index] == TYPE_STANDARD:
+                return index
+        return None
+
+    def release_untrained(self, index):
+        # A claimed Glim that was never converted goes back to the front of the queue
+        if self._type[index] == TYPE_STANDARD:
+            self._untrained.appendleft(index)
+
+    def _target_inputs(self, grid, targeting_mode):
+        return grid.frontier_array(targeting_mode), grid.mountain_array()
+
+    def _find_targets(self, grid, targeting_mode):
+        return self._assign(grid, *self._target_inputs(grid, targeting_mode))
+
+    def _assign(self, grid, frontier, mountains):
+        # A tile takes as many Glims as it still needs hits; any more would swing at a finished tile
+        is_stomper = self.glim_type == TYPE_STOMPER
+        need = _hits_needed(grid, frontier if not is_stomper.all() else frontier[:0], GLIM_CULTIVATION_STRENGTH)
+        room = _hits_needed(grid, mountains if is_stomper.any() else mountains[:0], GLIM_MINING_STRENGTH)
+        return _assign_targets(self.x, self.glim_type, self.target, frontier, need, mountains, room)
+
+    def _retarget(self, grid, targeting_mode):
+        # Targets are assigned for the whole swarm at once, and only when the frontier, the mountains or
+        # the Glims themselves change. Returns the tiles Glims let go of
+        frontier, mountains = self._target_inputs(grid, targeting_mode)
+        # The grid hands out new arrays whenever its barren tiles or mountains change
+        if (self.count == self._targets_key and self._targets_inputs
+                and frontier is self._targets_inputs[0] and mountains is self._targets_inputs[1]):
+            return np.empty(0, dtype=np.int32)
+        self._targets_key, self._targets_inputs = self.count, (frontier, mountains)
+        new_targets = self._assign(grid, frontier, mountains)
+        # If target changes, reset state
+        changed = new_targets != self.target
+        released = np.unique(self.target[changed])
+        self.state[changed] = STATE_IDLE
+        self.target[:] = new_targets
+        return released[released != NO_TARGET]
+
+    def update(self, delta_time, grid, targeting_mode, beacon_index):
+        if self.count == 0:
+            return 0, []
+        released = self._retarget(grid, targeting_mode)
+        hitting, landed = self._step(delta_time, grid.mountain_array(), grid.ground_y, beacon_index)
+        return self._land_hits(grid, released, hitting, landed, delta_time)
+
+    def _step(self, delta_time, mountains, ground_y, beacon_index):
+        return self.step_range(0, self.count, delta_time, mountains, ground_y, beacon_index.buffs_at(self.x))
+
+    def step_range(self, lo, hi, delta_time, mountains, ground_y, buffs):
+        # Moves Glims lo..hi-1 towards their assigned targets touching only their own rows, so disjoint
+        # ranges can be stepped apart. buffs holds each one's beacon speed buff at its current x.
+        # Returns the Glims whose hits land, for _land_hits to apply
+        x, y = self._x[lo:hi], self._y[lo:hi]
+        state, action_timer, target = self._state[lo:hi], self._action_timer[lo:hi], self._target[lo:hi]
+        origin_x, origin_y = self._origin_x[lo:hi], self._origin_y[lo:hi]
+        glim_type = self._type[lo:hi]
+        hitting = landed = np.empty(0, dtype=np.int64)
+
+        self._bob_timer[lo:hi] += delta_time * 10
+
+        has_target = target != NO_TARGET
+        state[~has_target] = STATE_IDLE
+        if not has_target.any():
+            return hitting, landed
+
+        speed = GLIM_SPEED * buffs
+        centerx = target * TILE_SIZE + TILE_SIZE // 2
+        centery = ground_y + TILE_SIZE // 2
+
+        # --- Standard Glim Logic ---
+        standard = np.flatnonzero(has_target & (glim_type == TYPE_STANDARD))
+        if len(standard):
+            arrived = _move_towards(x, y, standard, centerx[standard], ground_y - 8, speed[standard], delta_time)
+            working = standard[arrived]
+            action_timer[working] += delta_time
+            hitting = working[action_timer[working] >= GLIM_CULTIVATION_RATE] + lo
+
+        # --- Stomper Glim Logic (State Machine) ---
+        stompers = np.flatnonzero(has_target & (glim_type == TYPE_STOMPER))
+        if len(stompers):
+            on_mountain = np.isin(target[stompers], mountains)
+            state[stompers[~on_mountain]] = STATE_IDLE # Stompers only care about mountains
+            stompers = stompers[on_mountain]
+            stomper_state = state[stompers]
+
+            # State: idle
+            idle = stompers[stomper_state == STATE_IDLE]
+            if len(idle):
+                from_left = x[idle] < centerx[idle]
+                origin_x[idle] = np.where(from_left,
+                                          centerx[idle] - TILE_SIZE // 2 - STOMPER_LUNGE_DISTANCE,
+                                          centerx[idle] + TILE_SIZE // 2 + STOMPER_LUNGE_DISTANCE)
+                origin_y[idle] = centery
+                state[idle] = STATE_MOVING_TO_ORIGIN
+
+            # State: moving_to_origin
+            moving = stompers[stomper_state == STATE_MOVING_TO_ORIGIN]
+            if len(moving):
+                arrived = _move_towards(x, y, moving, origin_x[moving], origin_y[moving], speed[moving], delta_time)
+                state[moving[arrived]] = STATE_LUNGING
+
+            # State: lunging
+            lunging = stompers[stomper_state == STATE_LUNGING]
+            if len(lunging):
+                lunge_speed = speed[lunging] * STOMPER_LUNGE_SPEED_MULTIPLIER
+                arrived = _move_towards(x, y, lunging, centerx[lunging], centery, lunge_speed, delta_time)
+                landing = lunging[arrived]
+                state[landing] = STATE_RETURNING
+                action_timer[landing] = STOMPER_LUNGE_COOLDOWN
+                landed = landing + lo
+
+            # State: returning
+            returning = stompers[stomper_state == STATE_RETURNING]
+            if len(returning):
+                action_timer[returning] -= delta_time
+                arrived = _move_towards(x, y, returning, origin_x[returning], origin_y[returning], speed[returning], delta_time)
+                ready = arrived & (action_timer[returning] <= 0)
+                state[returning[ready]] = STATE_LUNGING
+
+        return hitting, landed
+
+    def _land_hits(self, grid, released, hitting, landed, delta_time):
+        # Tile damage is applied here, in tile order, whichever ranges the Glims were stepped in
+        if len(released):
+            for i in np.unique(released[np.isin(released, grid.mountain_array())]).tolist():
+                grid.tiles[i].is_being_mined = False
+
+        total_essence = 0
+        effects = []
+        for tile_index, hitters in _group_by_target(hitting, self._target[hitting]):
+            landed_hits, essence, effect = self._cultivate(grid.tiles[tile_index], len(hitters))
+            self._action_timer[hitters[:landed_hits]] = 0
+            # Glims that arrive after the tile turned living keep their wind-up for the next target
+            self._action_timer[hitters[landed_hits:]] -= delta_time
+            total_essence += essence
+            if effect: effects.append(effect)
+
+        for tile_index, hitters in _group_by_target(landed, self._target[landed]):
+            effect = self._mine(grid.tiles[tile_index], len(hitters))
+            if effect.get('type') == 'notification':
+                self._state[hitters] = STATE_IDLE
+            effects.append(effect)
+        return total_essence, effects
+
+    def _cultivate(self, tile, hits):
+        needed = math.ceil(tile.current_toughness / GLIM_CULTIVATION_STRENGTH)
+        landed = min(hits, needed)
+        if landed <= 0:
+            return 0, 0, None
+        result = tile.take_damage(GLIM_CULTIVATION_STRENGTH * landed)
+        if result == "core_cultivated":
+            essence = GLIM_CULTIVATION_STRENGTH * (landed - 1)
+            return landed, essence, {'type': 'core_cultivated'}
+        return landed, result, {'x': tile.rect.centerx, 'y': tile.rect.top - 8, 'text': f"+{result}"}
+
+    def _mine(self, tile, hits):
+        needed = math.ceil(tile.current_toughness / GLIM_MINING_STRENGTH)
+        landed = min(hits, needed)
+        tile.is_being_mined = True
+        result = tile.take_damage(GLIM_MINING_STRENGTH * landed)
+        if result == "mountain_cleared":
+            tile.is_being_mined = False
+            return {'type': 'notification', 'text': 'Mountain Cleared!'}
+        return {'x': tile.rect.centerx, 'y': tile.rect.centery, 'text': f"-{GLIM_MINING_STRENGTH * landed}"}
+
+    def _draw_crowds(self, screen, camera_offset_x, visible):
+        # Tiles holding more Glims than the threshold get one crowd sprite; the rest are drawn as usual
+        self.sprites_saved = 0
+        if self.crowd_threshold is None or len(visible) <= self.crowd_threshold:
+            return visible
+        columns = (self._x[visible] // TILE_SIZE).astype(np.int64)
+        first_column = columns.min()
+        counts = np.bincount(columns - first_column)
+        crowded = counts[columns - first_column] > self.crowd_threshold
+        if not crowded.any():
+            return visible
+
+        if self.font is None:
+            self.font = get_font("Arial", 12, bold=True)
+        crowd_surface = get_crowd_surface()
+        for column, members in _group_by_target(visible[crowded], columns[crowded]):
+            center = (round((column + 0.5) * TILE_SIZE - camera_offset_x), round(float(self._y[members].mean())))
+            crowd_rect = screen.blit(crowd_surface, crowd_surface.get_rect(center=center))
+            badge = render_text(self.font, str(len(members)), True, UI_TEXT_COLOR)
+            badge_rect = badge.get_rect(midbottom=(center[0], center[1] - crowd_surface.get_height() // 2))
+            pygame.draw.rect(screen, UI_BG_OVERLAY_COLOR, badge_rect.inflate(6, 2), border_radius=4)
+            screen.blit(badge, badge_rect)
+            self.drawn_rects.append(crowd_rect.union(badge_rect.inflate(6, 2)))
+            self.sprites_saved += len(members) - 1
+        return visible[~crowded]
+
+    def _get_surface(self, color_index, glim_type):
+        return get_glim_surface(color_index, GLIM_TYPES[glim_type])
+
+    def draw(self, screen, camera_offset_x):
+        # Margin covers the widest sprite plus its bob so edge Glims are not popped early
+        left = camera_offset_x - TILE_SIZE
+        right = camera_offset_x + screen.get_width() + TILE_SIZE
+        visible = np.flatnonzero((self.x > left) & (self.x < right))
+        culled = self.count - len(visible)
+        self.drawn_rects = []
+        visible = self._draw_crowds(screen, camera_offset_x, visible)
+
+        screen_x = _round_half_away(self._x[visible] - camera_offset_x)
+        screen_y = self._y[visible]
+        if len(visible) <= GLIM_BOB_DENSITY_LIMIT:
+            is_stomper = self._type[visible] == TYPE_STOMPER
+            bob_offset = np.sin(self._bob_timer[visible]) * np.where(is_stomper, 4, 2)
+            # Don't bob while lunging for a more direct look
+            bob_offset[is_stomper & (self._state[visible] == STATE_LUNGING)] = 0
+            screen_y = screen_y + bob_offset
+        screen_y = _round_half_away(screen_y)
+
+        # One blits() call per sprite; positions are shifted from centres to top-left corners
+        sprite_keys = self._color[visible].astype(np.int64) * len(GLIM_TYPES) + self._type[visible]
+        for sprite_key, group in _group_by_target(np.arange(len(visible)), sprite_keys):
+            color_index, glim_type = divmod(sprite_key, len(GLIM_TYPES))
+            surface = self._get_surface(color_index, glim_type)
+            width, height = surface.get_size()
+            xs = (screen_x[group] - width // 2).tolist()
+            ys = (screen_y[group] - height // 2).tolist()
+            screen.blits([(surface, position) for position in zip(xs, ys)], doreturn=False)
+        # Half a tile around each centre covers every sprite
+        self.drawn_rects.extend(_band_rects(screen_x, screen_y, TILE_SIZE // 2))
+        return culled
+
+def _hits_needed(grid, indices, strength):
+    # As floats, since tiles far out can be tough enough to overflow a sum of int64s
+    return np.ceil(np.array([grid.tiles[i].current_toughness for i in indices.tolist()], dtype=np.float64) / strength)
+
+def _assign_targets(xs, glim_types, current, frontier, need, mountains, room, spread=STOMPER_TARGET_SPREAD):
+    targets = np.full(len(xs), NO_TARGET, dtype=np.int32)
+    is_stomper = glim_types == TYPE_STOMPER
+    if len(frontier) and not is_stomper.all():
+        targets[~is_stomper] = _spread_standard(xs[~is_stomper], frontier, need)
+    if len(mountains) and is_stomper.any():
+        targets[is_stomper] = _balance_stompers(xs[is_stomper], current[is_stomper], mountains, room, spread)
+    return targets
+
+def _spread_counts(glims, need):
+    # Tiles nearest the center are filled first, each with as many Glims as it still needs hits. Glims left
+    # over once every tile is full are shared out by remaining toughness
+    filled = np.minimum(np.cumsum(need), glims).astype(np.int64)
+    counts = np.diff(filled, prepend=0)
+    spare = glims - filled[-1]
+    if spare:
+        share = np.floor(spare * need / need.sum()).astype(np.int64)
+        share[:spare - share.sum()] += 1
+        counts += share
+    return counts
+
+def _spread_standard(xs, frontier, need):
+    # Glims and tiles are paired off in order along the ground, so nobody walks across the crowd to reach their tile
+    counts = _spread_counts(len(xs), need)
+    by_position = np.argsort(frontier, kind='stable')
+    targets = np.empty(len(xs), dtype=np.int32)
+    targets[np.argsort(xs, kind='stable')] = np.repeat(frontier[by_position], counts[by_position])
+    return targets
+
+def _balance_stompers(xs, current, mountains, room, spread):
+    # Each stomper may work one of the `spread` nearest mountains on either side of it, at most `room` to
+    # a mountain. Stompers keep a mountain they already hold while it has room; the rest fill the free
+    # ones nearest first, and any left over once all of those are full take their nearest anyway
+    centers = mountains * TILE_SIZE + TILE_SIZE // 2
+    candidates = np.searchsorted(centers, xs)[:, None] + np.arange(-spread, spread)
+    valid = (candidates >= 0) & (candidates < len(mountains))
+    candidates = np.clip(candidates, 0, len(mountains) - 1)
+    # Stable, so ties go to the lower index, like a left-to-right linear scan
+    order = np.argsort(np.where(valid, np.abs(centers[candidates] - xs[:, None]), np.inf), axis=1, kind='stable')
+    candidates = np.take_along_axis(candidates, order, axis=1)
+    valid = np.take_along_axis(valid, order, axis=1)
+
+    choice = np.full(len(xs), -1, dtype=np.int64)
+    load = np.zeros(len(mountains), dtype=np.int64)
+    held = np.searchsorted(mountains, current)
+    keeping = (held[:, None] == candidates) & valid & (mountains[np.minimum(held, len(mountains) - 1)] == current)[:, None]
+    rounds = [(keeping.any(axis=1), held)] + [(valid[:, r], candidates[:, r]) for r in range(2 * spread)]
+    for wanted, slots in rounds:
+        pending = np.flatnonzero(wanted & (choice < 0))
+        if len(pending) == 0:
+            continue
+        # Within a mountain, lower Glim indices are seated first
+        order = np.argsort(slots[pending], kind='stable')
+        pending, slots_wanted = pending[order], slots[pending][order]
+        unique, starts, counts = np.unique(slots_wanted, return_index=True, return_counts=True)
+        seat = np.arange(len(pending)) - np.repeat(starts, counts)
+        seated = seat < np.repeat(room[unique] - load[unique], counts)
+        choice[pending[seated]] = slots_wanted[seated]
+        load += np.bincount(slots_wanted[seated], minlength=len(mountains))
+    unseated = choice < 0
+    choice[unseated] = candidates[unseated, 0]
+    return mountains[choice]
+
+def _move_towards(x, y, idx, target_x, target_y, speed, delta_time):
+    dx = target_x - x[idx]
+    dy = target_y - y[idx]
+    dist = np.hypot(dx, dy)
+    arrived = dist < 2
+    moving = ~arrived
+    step = np.zeros_like(dist)
+    # Steps stop at the target; beacon-buffed lunges would otherwise hop back and forth over it without arriving
+    step[moving] = np.minimum(speed[moving] * delta_time / dist[moving], 1.0)
+    x[idx] += dx * step
+    y[idx] += dy * step
+    return arrived
+
+def _band_rects(xs, ys, margin):
+    # One rect per occupied band of the screen, around every point that falls in it
+    if len(xs) == 0:
+        return []
+    bands = xs // DIRTY_RECT_BAND_WIDTH
+    order = np.argsort(bands, kind='stable')
+    bands, xs, ys = bands[order], xs[order], ys[order]
+    starts = np.flatnonzero(np.r_[True, bands[1:] != bands[:-1]])
+    lefts = (np.minimum.reduceat(xs, starts) - margin).tolist()
+    rights = (np.maximum.reduceat(xs, starts) + margin).tolist()
+    tops = (np.minimum.reduceat(ys, starts) - margin).tolist()
+    bottoms = (np.maximum.reduceat(ys, starts) + margin).tolist()
+    return [pygame.Rect(left, top, right - left, bottom - top) for left, right, top, bottom in zip(lefts, rights, tops, bottoms)]
+
+def _round_half_away(values):
+    # Matches how pygame rounds float rect positions
+    return np.trunc(values + np.copysign(0.5, values)).astype(np.int64)
+
+def _group_by_target(indices, targets):
+    if len(indices) == 0:
+        return []
+    order = np.argsort(targets, kind='stable')
+    unique, starts = np.unique(targets[order], return_index=True)
+    return zip(unique.tolist(), np.split(indices[order], starts[1:]))
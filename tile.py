@@ -1,11 +1,15 @@
 import pygame
 import random
 import math
+import numpy as np
 from settings import (TILE_SIZE, DIRT_BROWN, GRASS_GREEN, DARK_GRASS_GREEN, WHITE, 
-                      GRID_LINE_COLOR, TILE_TEXT_COLOR, PASSIVE_INCOME_AMOUNT, 
+                      GRID_LINE_COLOR, TILE_TEXT_COLOR, 
                       PASSIVE_INCOME_INTERVAL, LANDMARK_COLOR_PRIMARY, LANDMARK_COLOR_SECONDARY, 
                       MOUNTAIN_COLOR_DARK, MOUNTAIN_COLOR_LIGHT, CORE_TILE_COLOR,
-                      BASE_TOUGHNESS, TOUGHNESS_MULTIPLIER)
+                      BASE_TOUGHNESS, TOUGHNESS_MULTIPLIER, TILE_PULSE_LEVELS,
+                      MAX_TILE_TOUGHNESS)
+from text_cache import render_text, get_font
+from atlas import atlas
 
 def format_toughness(num):
     if num < 1000:
@@ -15,8 +19,105 @@ def format_toughness(num):
     else:
         return f"{num/1_000_000:.1f}M"
 
+def toughness_at(distance):
+    try:
+        return min(round(BASE_TOUGHNESS * (TOUGHNESS_MULTIPLIER ** distance)), MAX_TILE_TOUGHNESS)
+    except OverflowError:
+        return MAX_TILE_TOUGHNESS
+
+def create_living_surface():
+    surface = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
+    surface.fill(DIRT_BROWN)
+    pygame.draw.rect(surface, GRASS_GREEN, (0, 0, TILE_SIZE, TILE_SIZE // 3))
+    for i in range(TILE_SIZE // 4):
+        x = (i * 13) % TILE_SIZE
+        y = (i * 7) % (TILE_SIZE // 3)
+        pygame.draw.rect(surface, DARK_GRASS_GREEN, (x, y, 2, 2))
+    return surface
+
+def create_mountain_surface(variant):
+    # Each silhouette is seeded by its variant so the shared set looks the same every run
+    rng = random.Random(variant)
+    surface = pygame.Surface((TILE_SIZE, TILE_SIZE * 4), pygame.SRCALPHA)
+    height = rng.randint(int(TILE_SIZE * 1.5), TILE_SIZE * 4)
+    points = [
+        (0, TILE_SIZE * 4),
+        (0, rng.randint(height // 2, height)),
+        (TILE_SIZE // 2, rng.randint(0, height // 3)),
+        (TILE_SIZE, rng.randint(height // 2, height)),
+        (TILE_SIZE, TILE_SIZE * 4)
+    ]
+    pygame.draw.polygon(surface, MOUNTAIN_COLOR_DARK, points)
+    pygame.draw.polygon(surface, MOUNTAIN_COLOR_LIGHT, points, 2)
+    return surface
+
+def create_landmark_surface():
+    surface = pygame.Surface((TILE_SIZE, TILE_SIZE * 2), pygame.SRCALPHA)
+    points = [(TILE_SIZE // 2, 0), (TILE_SIZE - 4, TILE_SIZE), (4, TILE_SIZE)]
+    pygame.draw.polygon(surface, LANDMARK_COLOR_PRIMARY, points)
+    pygame.draw.polygon(surface, LANDMARK_COLOR_SECONDARY, points, 3)
+    return surface
+
+TILE_STATES = ('barren', 'living', 'mountain')
+STATE_BARREN = 0
+STATE_LIVING = 1
+STATE_MOUNTAIN = 2
+
+NO_STRUCTURE = 0
+
+# Per-tile columns that are saved; structure ids are rebuilt from the saved structures
+TILE_COLUMNS = ('state', 'current_toughness', 'max_toughness', 'passive_timer')
+
+class TileArray:
+    def __init__(self, size):
+        self.state = np.zeros(size, dtype=np.int8)
+        self.current_toughness = np.zeros(size, dtype=np.int64)
+        self.max_toughness = np.zeros(size, dtype=np.int64)
+        self.passive_timer = np.zeros(size)
+        self.structure_ids = np.full(size, NO_STRUCTURE, dtype=np.int32)
+        self.is_center = np.zeros(size, dtype=bool)
+        self.structures = {}
+        self._next_structure_id = NO_STRUCTURE + 1
+
+    def __len__(self):
+        return len(self.state)
+
+    def columns(self):
+        return {name: getattr(self, name) for name in TILE_COLUMNS}
+
+    def load_columns(self, columns):
+        for name in TILE_COLUMNS:
+            getattr(self, name)[:] = columns[name]
+
+    def attach_structure(self, index, structure):
+        self.detach_structure(index)
+        self.structure_ids[index] = self._next_structure_id
+        self.structures[self._next_structure_id] = structure
+        self._next_structure_id += 1
+
+    def detach_structure(self, index):
+        self.structures.pop(int(self.structure_ids[index]), None)
+        self.structure_ids[index] = NO_STRUCTURE
+
+    def earning(self):
+        return (self.state == STATE_LIVING) & ~self.is_center & (self.structure_ids == NO_STRUCTURE)
+
+    def fast_forward_passive_income(self, seconds, earning=None):
+        # Passive income over a span in which no tile changes state, in closed form. The earning mask
+        # can be passed in when it is the one from before a change
+        if earning is None:
+            earning = self.earning()
+        elapsed = self.passive_timer[earning] + seconds
+        payouts = np.floor(elapsed / PASSIVE_INCOME_INTERVAL)
+        self.passive_timer[earning] = elapsed - payouts * PASSIVE_INCOME_INTERVAL
+        return int(payouts.sum())
+
 class Tile:
-    def __init__(self, x_pos, y_pos, toughness, state='barren', is_center=False, is_core=False, distance_from_center=0):
+    def __init__(self, x_pos, y_pos, toughness, state='barren', is_center=False, is_core=False, distance_from_center=0,
+                 tile_array=None, index=0, mountain_variant=0):
+        # A Tile is a view onto one slot of a TileArray; standalone tiles get a one-slot array
+        self.tile_array = tile_array if tile_array is not None else TileArray(1)
+        self.index = index
         self.x_pos = x_pos
         self.y_pos = y_pos
         self.max_toughness = toughness
@@ -25,48 +126,75 @@ class Tile:
         self.is_center = is_center
         self.is_core = is_core
         self.distance_from_center = distance_from_center
+        self.mountain_variant = mountain_variant
         self.rect = pygame.Rect(self.x_pos, self.y_pos, TILE_SIZE, TILE_SIZE)
-        self.structure = None
-        self.is_being_mined = False
+        self._is_being_mined = False
+        self.on_state_change = None
+        self.on_structure_change = None
+
+        # Set when the tile's look changes so a cached rendering can be refreshed
+        self.dirty = True
+        self.on_dirty = None
 
-        self.living_surface = self._create_living_surface()
-        self.landmark_surface = self._create_landmark_surface() if is_center else None
-        self.mountain_surface = self._create_mountain_surface() if state == 'mountain' else None
+        # Render resources are created on first draw so headless runs never touch pygame surfaces
+        self.living_sprite = None
+        self.landmark_sprite = None
+        self.mountain_sprite = None
+        self.font = None
 
-        self.font = pygame.font.SysFont("Arial", 14)
-        self.passive_timer = 0
         self.pulse_timer = 0
+        self.pulse_level = 0
 
-    def _create_living_surface(self):
-        surface = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
-        surface.fill(DIRT_BROWN)
-        pygame.draw.rect(surface, GRASS_GREEN, (0, 0, TILE_SIZE, TILE_SIZE // 3))
-        for i in range(TILE_SIZE // 4):
-            x = (i * 13) % TILE_SIZE
-            y = (i * 7) % (TILE_SIZE // 3)
-            pygame.draw.rect(surface, DARK_GRASS_GREEN, (x, y, 2, 2))
-        return surface
-    
-    def _create_mountain_surface(self):
-        surface = pygame.Surface((TILE_SIZE, TILE_SIZE * 4), pygame.SRCALPHA)
-        height = random.randint(int(TILE_SIZE * 1.5), TILE_SIZE * 4)
-        points = [
-            (0, TILE_SIZE * 4),
-            (0, random.randint(height // 2, height)),
-            (TILE_SIZE // 2, random.randint(0, height // 3)),
-            (TILE_SIZE, random.randint(height // 2, height)),
-            (TILE_SIZE, TILE_SIZE * 4)
-        ]
-        pygame.draw.polygon(surface, MOUNTAIN_COLOR_DARK, points)
-        pygame.draw.polygon(surface, MOUNTAIN_COLOR_LIGHT, points, 2)
-        return surface
-
-    def _create_landmark_surface(self):
-        surface = pygame.Surface((TILE_SIZE, TILE_SIZE * 2), pygame.SRCALPHA)
-        points = [(TILE_SIZE // 2, 0), (TILE_SIZE - 4, TILE_SIZE), (4, TILE_SIZE)]
-        pygame.draw.polygon(surface, LANDMARK_COLOR_PRIMARY, points)
-        pygame.draw.polygon(surface, LANDMARK_COLOR_SECONDARY, points, 3)
-        return surface
+    @property
+    def state(self):
+        return TILE_STATES[self.tile_array.state[self.index]]
+
+    @state.setter
+    def state(self, value):
+        self.tile_array.state[self.index] = TILE_STATES.index(value)
+
+    @property
+    def current_toughness(self):
+        return int(self.tile_array.current_toughness[self.index])
+
+    @current_toughness.setter
+    def current_toughness(self, value):
+        self.tile_array.current_toughness[self.index] = value
+
+    @property
+    def max_toughness(self):
+        return int(self.tile_array.max_toughness[self.index])
+
+    @max_toughness.setter
+    def max_toughness(self, value):
+        self.tile_array.max_toughness[self.index] = value
+
+    @property
+    def is_center(self):
+        return bool(self.tile_array.is_center[self.index])
+
+    @is_center.setter
+    def is_center(self, value):
+        self.tile_array.is_center[self.index] = value
+
+    @property
+    def structure(self):
+        return self.tile_array.structures.get(int(self.tile_array.structure_ids[self.index]))
+
+    @structure.setter
+    def structure(self, structure):
+        if structure is None:
+            self.tile_array.detach_structure(self.index)
+        else:
+            self.tile_array.attach_structure(self.index, structure)
+        if self.on_structure_change:
+            self.on_structure_change(self)
+
+    def _create_render_resources(self):
+        self.living_sprite = ('tile', 'living')
+        self.landmark_sprite = ('tile', 'landmark') if self.is_center else None
+        self.mountain_sprite = ('mountain', self.mountain_variant) if self.state == 'mountain' else None
+        self.font = get_font("Arial", 14)
 
     def set_structure(self, structure):
         self.structure = structure
@@ -74,6 +202,29 @@ class Tile:
     def is_buildable(self):
         return self.state == 'living' and not self.is_center and self.structure is None
 
+    @property
+    def is_being_mined(self):
+        return self._is_being_mined
+
+    @is_being_mined.setter
+    def is_being_mined(self, value):
+        if value != self._is_being_mined:
+            self._is_being_mined = value
+            self.mark_dirty()
+
+    def mark_dirty(self):
+        if not self.dirty:
+            self.dirty = True
+            if self.on_dirty:
+                self.on_dirty(self)
+
+    def _set_state(self, state):
+        old_state = self.state
+        self.state = state
+        self.mark_dirty()
+        if self.on_state_change:
+            self.on_state_change(self, old_state)
+
     def take_damage(self, amount, by_player=False):
         if by_player and self.state == 'mountain':
             return 0
@@ -81,65 +232,65 @@ class Tile:
         if self.state == 'barren' or self.state == 'mountain':
             was_mountain = self.state == 'mountain'
             self.current_toughness -= amount
+            self.mark_dirty()
             if self.current_toughness <= 0:
                 if self.is_core:
-                    self.state = 'living'
+                    self._set_state('living')
                     self.current_toughness = 0
                     return "core_cultivated"
                 
                 if was_mountain:
-                    self.state = 'barren'
+                    self._set_state('barren')
                     # Recalculate toughness based on distance
-                    new_toughness = round(BASE_TOUGHNESS * (TOUGHNESS_MULTIPLIER ** self.distance_from_center))
+                    new_toughness = toughness_at(self.distance_from_center)
                     self.max_toughness = new_toughness
                     self.current_toughness = new_toughness
                     return "mountain_cleared"
                 else:
-                    self.state = 'living'
+                    self._set_state('living')
                     self.current_toughness = 0
             
             return amount
         return 0
     
-    def update(self, delta_time):
+    def update_pulse(self, delta_time):
         if self.is_core and self.state == 'barren':
             self.pulse_timer += delta_time * 5
+            pulse_level = round((math.sin(self.pulse_timer) + 1) / 2 * TILE_PULSE_LEVELS)
+            if pulse_level != self.pulse_level:
+                self.pulse_level = pulse_level
+                self.mark_dirty()
 
-        if self.state == 'living' and not self.is_center and self.structure is None:
-            self.passive_timer += delta_time
-            if self.passive_timer >= PASSIVE_INCOME_INTERVAL:
-                self.passive_timer -= PASSIVE_INCOME_INTERVAL
-                effect = {'x': self.rect.centerx, 'y': self.rect.y, 'text': f"+{PASSIVE_INCOME_AMOUNT}"}
-                return PASSIVE_INCOME_AMOUNT, effect
-        
-        return 0, None
+    def draw(self, screen, camera_offset_x, camera_offset_y=0):
+        if self.font is None:
+            self._create_render_resources()
 
-    def draw(self, screen, camera_offset_x):
         on_screen_rect = self.rect.copy()
         on_screen_rect.x -= camera_offset_x
+        on_screen_rect.y -= camera_offset_y
 
         if self.state == 'barren':
             color = WHITE
             if self.is_core:
-                pulse = (math.sin(self.pulse_timer) + 1) / 2
+                pulse = self.pulse_level / TILE_PULSE_LEVELS
                 color = WHITE.lerp(CORE_TILE_COLOR, pulse)
             pygame.draw.rect(screen, color, on_screen_rect)
             pygame.draw.rect(screen, GRID_LINE_COLOR, on_screen_rect, 1)
             
             if self.current_toughness > 0:
-                text_surf = self.font.render(format_toughness(self.current_toughness), True, TILE_TEXT_COLOR)
+                text_surf = render_text(self.font, format_toughness(self.current_toughness), True, TILE_TEXT_COLOR)
                 text_rect = text_surf.get_rect(center=on_screen_rect.center)
                 screen.blit(text_surf, text_rect)
         elif self.state == 'mountain':
-            if self.mountain_surface:
-                mountain_rect = self.mountain_surface.get_rect(bottomleft=on_screen_rect.bottomleft)
-                screen.blit(self.mountain_surface, mountain_rect)
+            if self.mountain_sprite:
+                mountain_surface = atlas.get(self.mountain_sprite, create_mountain_surface, self.mountain_sprite[1])
+                screen.blit(mountain_surface, mountain_surface.get_rect(bottomleft=on_screen_rect.bottomleft))
             if self.is_being_mined:
-                text_surf = self.font.render(format_toughness(self.current_toughness), True, WHITE)
+                text_surf = render_text(self.font, format_toughness(self.current_toughness), True, WHITE)
                 text_rect = text_surf.get_rect(center=on_screen_rect.center)
                 screen.blit(text_surf, text_rect)
         else: # living
-            screen.blit(self.living_surface, on_screen_rect)
-            if self.is_center and self.landmark_surface:
-                landmark_rect = self.landmark_surface.get_rect(midbottom=on_screen_rect.midtop)
-                screen.blit(self.landmark_surface, landmark_rect)
+            screen.blit(atlas.get(self.living_sprite, create_living_surface), on_screen_rect)
+            if self.is_center and self.landmark_sprite:
+                landmark_surface = atlas.get(self.landmark_sprite, create_landmark_surface)
+                screen.blit(landmark_surface, landmark_surface.get_rect(midbottom=on_screen_rect.midtop))
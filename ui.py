@@ -4,41 +4,21 @@ from settings import (UI_TEXT_COLOR, GLIM_COST, WELLSPRING_COST, BEACON_COST,
                       UI_BUTTON_COLOR, UI_BUTTON_HOVER_COLOR, HAMMER_ICON_PATH, 
                       UI_PANEL_COLOR, UI_BG_OVERLAY_COLOR, SKILL_ICON_PATH, 
                       MOTION_SKILL_ICON_PATH, DESTROY_ICON_PATH)
-
-class FloatingText:
-    def __init__(self, x, y, text, font, duration=1.5, speed=20, color=UI_TEXT_COLOR):
-        self.x = x
-        self.y = y
-        self.font = font
-        self.text = text
-        self.color = color
-        self.surface = self.font.render(self.text, True, self.color)
-        self.alpha = 255
-        self.duration = duration
-        self.timer = self.duration
-        self.speed = speed
-
-    def update(self, delta_time):
-        self.timer -= delta_time
-        self.y -= self.speed * delta_time
-        self.alpha = max(0, 255 * (self.timer / self.duration))
-        if self.timer <= 0: return False
-        return True
-
-    def draw(self, screen, camera_offset_x):
-        self.surface.set_alpha(self.alpha)
-        screen.blit(self.surface, (self.x - camera_offset_x, self.y))
+from text_cache import render_text, get_font
+from effects import EffectPipeline
 
 class UI:
-    def __init__(self, game_state, screen_width, screen_height):
+    def __init__(self, game_state, screen_width, screen_height, profiler=None):
         self.game_state = game_state
+        self.profiler = profiler
+        self.show_profiler = False
         self.screen_width = screen_width
         self.screen_height = screen_height
 
-        self.font_large = pygame.font.SysFont("Arial", 24, bold=True)
-        self.font_small = pygame.font.SysFont("Arial", 18)
-        self.font_tiny = pygame.font.SysFont("Arial", 12, bold=True)
-        self.floating_texts = []
+        self.font_large = get_font("Arial", 24, bold=True)
+        self.font_small = get_font("Arial", 18)
+        self.font_tiny = get_font("Arial", 12, bold=True)
+        self.effects = EffectPipeline(self.font_large)
         
         self.glim_button_rect = pygame.Rect(0, 0, 180, 50)
         self.build_menu_button_rect = pygame.Rect(0, 0, 60, 60)
@@ -59,6 +39,8 @@ class UI:
 
         self.build_menu_open = False
         self.skill_tree_open = False
+        self.drawn_rects = [] # Screen areas covered by the last draw
+        self._overlay_shown = False
         
         self.hammer_icon = self._load_icon(HAMMER_ICON_PATH, (40, 40))
         self.skill_icon = self._load_icon(SKILL_ICON_PATH, (40, 40))
@@ -72,11 +54,15 @@ class UI:
         except pygame.error:
             return None
 
+    @property
+    def floating_texts(self):
+        return self.effects.active
+
     def add_floating_text(self, x, y, text, duration=1.5):
-        self.floating_texts.append(FloatingText(x, y, text, self.font_large, duration=duration))
+        self.effects.add(x, y, text, duration=duration)
 
     def update(self, delta_time):
-        self.floating_texts = [ft for ft in self.floating_texts if ft.update(delta_time)]
+        self.effects.update(delta_time)
 
     def show_notification(self, text, duration=4):
         self.add_floating_text(self.screen_width / 2, self.screen_height - 100, text, duration=duration)
@@ -115,17 +101,22 @@ class UI:
     def draw(self, screen, camera_offset_x):
         mouse_pos = pygame.mouse.get_pos()
         essence_text = f"Life Essence: {self.game_state.life_essence}"
-        text_surface = self.font_large.render(essence_text, True, UI_TEXT_COLOR)
-        screen.blit(text_surface, text_surface.get_rect(topright=(self.screen_width - 15, 10)))
+        text_surface = render_text(self.font_large, essence_text, True, UI_TEXT_COLOR)
+        self.drawn_rects = [screen.blit(text_surface, text_surface.get_rect(topright=(self.screen_width - 15, 10)))]
         
         glim_count_text = f"Glims: {len(self.game_state.glims)}/{self.game_state.glim_cap}"
-        glim_surf = self.font_large.render(glim_count_text, True, UI_TEXT_COLOR)
-        screen.blit(glim_surf, glim_surf.get_rect(topright=(self.screen_width - 15, 40)))
+        glim_surf = render_text(self.font_large, glim_count_text, True, UI_TEXT_COLOR)
+        self.drawn_rects.append(screen.blit(glim_surf, glim_surf.get_rect(topright=(self.screen_width - 15, 40))))
 
         if self.game_state.skill_tree_unlocked:
             sp_text = f"Skill Points: {self.game_state.skill_points}"
-            sp_surf = self.font_large.render(sp_text, True, UI_TEXT_COLOR)
-            screen.blit(sp_surf, sp_surf.get_rect(topright=(self.screen_width - 15, 70)))
+            sp_surf = render_text(self.font_large, sp_text, True, UI_TEXT_COLOR)
+            self.drawn_rects.append(screen.blit(sp_surf, sp_surf.get_rect(topright=(self.screen_width - 15, 70))))
+
+        if self.effects.mode == 'rates':
+            rate_text = f"Income: +{self.effects.income_rate():.1f}/s"
+            rate_surf = render_text(self.font_small, rate_text, True, UI_TEXT_COLOR)
+            self.drawn_rects.append(screen.blit(rate_surf, rate_surf.get_rect(topright=(self.screen_width - 15, 100))))
 
         self.glim_button_rect.bottomright = (self.screen_width - 15, self.screen_height - 15)
         self._draw_button(screen, self.glim_button_rect, "Purchase Glim", f"(Cost: {GLIM_COST})", "glim")
@@ -140,17 +131,52 @@ class UI:
             self.skill_tree_button_rect.bottomright = (self.build_menu_button_rect.left - 10, self.screen_height - 15)
             self._draw_skill_tree_button(screen)
 
+        # The dimmed background covers the whole screen, so only its coming and going is a change
+        overlay_shown = self.build_menu_open or self.skill_tree_open
+        if overlay_shown != self._overlay_shown:
+            self.drawn_rects.append(screen.get_rect())
+            self._overlay_shown = overlay_shown
         if self.build_menu_open: self._draw_build_panel(screen, mouse_pos)
         if self.skill_tree_open: self._draw_skill_tree_panel(screen, mouse_pos)
 
-        for ft in self.floating_texts: ft.draw(screen, camera_offset_x)
+        culled = 0
+        for ft in self.floating_texts:
+            screen_x = ft.x - camera_offset_x
+            if screen_x + ft.surface.get_width() < 0 or screen_x > self.screen_width:
+                culled += 1
+                continue
+            self.drawn_rects.append(ft.draw(screen, camera_offset_x))
+
+        if self.show_profiler and self.profiler: self._draw_profiler_overlay(screen)
+        return culled
+
+    def _draw_profiler_overlay(self, screen):
+        profiler = self.profiler
+        lines = [f"{'phase':<18}{'p50 ms':>9}{'p99 ms':>9}"]
+        for name in sorted(profiler.phases, key=lambda n: (n != 'frame', n)):
+            p50, p99 = profiler.percentiles(name)
+            lines.append(f"{name:<18}{p50:>9.2f}{p99:>9.2f}")
+        lines.extend(f"{name:<18}{value:>9}" for name, value in profiler.counts.items())
+
+        # Rendered directly: these lines change every frame and would only churn the text cache
+        surfaces = [self.font_tiny.render(line, True, UI_TEXT_COLOR) for line in lines]
+        width = max(s.get_width() for s in surfaces) + 20
+        height = sum(s.get_height() + 2 for s in surfaces) + 20
+        panel = pygame.Surface((width, height), pygame.SRCALPHA)
+        panel.fill(UI_BG_OVERLAY_COLOR)
+        current_y = 10
+        for surface in surfaces:
+            panel.blit(surface, (10, current_y))
+            current_y += surface.get_height() + 2
+        self.drawn_rects.append(screen.blit(panel, (10, 10)))
 
     def _draw_build_panel(self, screen, mouse_pos):
         self._draw_panel_background(screen)
         pygame.draw.rect(screen, UI_PANEL_COLOR, self.build_panel_rect, border_radius=15)
         pygame.draw.rect(screen, UI_BUTTON_HOVER_COLOR, self.build_panel_rect, 3, 15)
+        self.drawn_rects.append(self.build_panel_rect.copy())
         
-        title_surf = self.font_large.render("Build Menu", True, UI_TEXT_COLOR)
+        title_surf = render_text(self.font_large, "Build Menu", True, UI_TEXT_COLOR)
         screen.blit(title_surf, title_surf.get_rect(center=(self.build_panel_rect.centerx, self.build_panel_rect.top + 30)))
 
         self.well_button_rect.topleft = (self.build_panel_rect.left + 25, self.build_panel_rect.top + 70)
@@ -174,8 +200,9 @@ class UI:
         self._draw_panel_background(screen)
         pygame.draw.rect(screen, UI_PANEL_COLOR, self.skill_panel_rect, border_radius=15)
         pygame.draw.rect(screen, UI_BUTTON_HOVER_COLOR, self.skill_panel_rect, 3, 15)
+        self.drawn_rects.append(self.skill_panel_rect.copy())
 
-        title_surf = self.font_large.render("Skill Tree", True, UI_TEXT_COLOR)
+        title_surf = render_text(self.font_large, "Skill Tree", True, UI_TEXT_COLOR)
         screen.blit(title_surf, title_surf.get_rect(center=(self.skill_panel_rect.centerx, self.skill_panel_rect.top + 30)))
         
         self.motion_skill_rect.center = (self.skill_panel_rect.centerx, self.skill_panel_rect.top + 120)
@@ -214,7 +241,7 @@ class UI:
     def _draw_info_tooltip(self, screen, mouse_pos, lines):
         if not lines: return
         
-        surfaces = [self.font_small.render(line, True, UI_TEXT_COLOR) for line in lines]
+        surfaces = [render_text(self.font_small, line, True, UI_TEXT_COLOR) for line in lines]
         max_width = max(s.get_width() for s in surfaces)
         total_height = sum(s.get_height() for s in surfaces) + (len(surfaces) - 1) * 5
         
@@ -227,6 +254,7 @@ class UI:
 
         pygame.draw.rect(screen, UI_PANEL_COLOR, tooltip_rect, border_radius=5)
         pygame.draw.rect(screen, UI_BUTTON_HOVER_COLOR, tooltip_rect, 2, 5)
+        self.drawn_rects.append(tooltip_rect)
 
         current_y = tooltip_rect.top + 10
         for surface in surfaces:
@@ -253,11 +281,12 @@ class UI:
         hover = rect.collidepoint(mouse_pos)
         color = UI_BUTTON_HOVER_COLOR if hover or is_active else UI_BUTTON_COLOR
         pygame.draw.rect(screen, color, rect, border_radius=8)
+        self.drawn_rects.append(rect.copy())
         
         if icon:
             screen.blit(icon, icon.get_rect(center=rect.center))
         
-        text_surf = self.font_tiny.render(key_text, True, UI_TEXT_COLOR)
+        text_surf = render_text(self.font_tiny, key_text, True, UI_TEXT_COLOR)
         screen.blit(text_surf, (rect.left + 5, rect.bottom - 15))
 
     def _draw_button(self, screen, rect, text_l1, text_l2, item_type):
@@ -274,11 +303,9 @@ class UI:
         button_surface = pygame.Surface(rect.size, pygame.SRCALPHA)
         pygame.draw.rect(button_surface, final_color, button_surface.get_rect(topleft=(0,0)), border_radius=5)
         
-        text_surf_l1 = self.font_small.render(text_l1, True, UI_TEXT_COLOR)
-        text_surf_l2 = self.font_small.render(text_l2, True, UI_TEXT_COLOR)
-        text_surf_l1.set_alpha(alpha)
-        text_surf_l2.set_alpha(alpha)
+        text_surf_l1 = render_text(self.font_small, text_l1, True, UI_TEXT_COLOR, alpha)
+        text_surf_l2 = render_text(self.font_small, text_l2, True, UI_TEXT_COLOR, alpha)
 
         button_surface.blit(text_surf_l1, text_surf_l1.get_rect(center=(rect.width / 2, rect.height / 2 - 10)))
         button_surface.blit(text_surf_l2, text_surf_l2.get_rect(center=(rect.width / 2, rect.height / 2 + 10)))
-        screen.blit(button_surface, rect)
+        self.drawn_rects.append(screen.blit(button_surface, rect))
@@ -0,0 +1,61 @@
+import pygame
+from settings import TILE_SIZE, WORLD_SIZE_TILES, WORLD_CHUNK_TILES, MOUNTAIN_TOUGHNESS
+from tile import STATE_LIVING, STATE_MOUNTAIN, NO_STRUCTURE, create_living_surface
+from atlas import atlas
+
+CHUNK_COUNT = -(-WORLD_SIZE_TILES // WORLD_CHUNK_TILES)
+
+def create_living_chunk_surface(size):
+    # A compressed chunk is drawn as a row of living tiles along the bottom of a strip-height surface
+    surface = pygame.Surface((size * TILE_SIZE, 4 * TILE_SIZE), pygame.SRCALPHA)
+    living_surface = atlas.get(('tile', 'living'), create_living_surface)
+    for slot in range(size):
+        surface.blit(living_surface, (slot * TILE_SIZE, 3 * TILE_SIZE))
+    return surface
+
+class Chunk:
+    # A run of tiles generated together. While loaded it owns a TileArray with Tile views onto it;
+    # compressed, it keeps only the income timer its tiles share
+    def __init__(self, index):
+        self.index = index
+        self.first = index * WORLD_CHUNK_TILES
+        self.size = min(WORLD_CHUNK_TILES, WORLD_SIZE_TILES - self.first)
+        self.tile_array = None
+        self.tiles = None
+        self.passive_timer = 0.0
+        self.passive_settled = 0.0 # Grid passive clock the chunk's income has been worked out up to
+        self.surface = None
+
+    @property
+    def loaded(self):
+        return self.tiles is not None
+
+    def can_compress(self):
+        # Living tiles never change again, so only their income has to be kept
+        tile_array = self.tile_array
+        return bool((tile_array.state == STATE_LIVING).all() and not tile_array.is_center.any()
+                    and (tile_array.structure_ids == NO_STRUCTURE).all())
+
+    def is_pristine(self):
+        # Untouched mountains come back exactly the same when the chunk is generated again
+        tile_array = self.tile_array
+        return bool((tile_array.state == STATE_MOUNTAIN).all()
+                    and (tile_array.current_toughness == MOUNTAIN_TOUGHNESS).all()
+                    and not any(tile.is_being_mined for tile in self.tiles))
+
+class TileRow:
+    # Indexes like a list of every tile in the world, generating or expanding chunks as tiles are
+    # asked for. Iteration only walks loaded tiles, so it never generates the rest of the world
+    def __init__(self, grid):
+        self.grid = grid
+
+    def __len__(self):
+        return WORLD_SIZE_TILES
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.grid.tile(i) for i in range(*index.indices(WORLD_SIZE_TILES))]
+        return self.grid.tile(index)
+
+    def __iter__(self):
+        return self.grid.loaded_tiles()